@@ -0,0 +1,18 @@
+"""
+Settings profile picked by the `BOOKS_SETTINGS_PROFILE` environment variable:
+`dev` (the default), `test` or `prod`.
+"""
+import os
+from importlib import import_module
+
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('dev', 'test', 'prod')
+
+SETTINGS_PROFILE = os.environ.get('BOOKS_SETTINGS_PROFILE', 'dev')
+if SETTINGS_PROFILE not in PROFILES:
+    raise ImproperlyConfigured(f'BOOKS_SETTINGS_PROFILE must be one of {", ".join(PROFILES)}, '
+                               f'not "{SETTINGS_PROFILE}".')
+
+_profile = import_module(f'{__name__}.{SETTINGS_PROFILE}')
+globals().update((name, value) for name, value in vars(_profile).items() if name.isupper())
@@ -1,5 +1,5 @@
 """
-Django settings for books project.
+Django settings for books project, shared by every profile (see books/settings/__init__.py).
 
 Generated by 'django-admin startproject' using Django 3.2.7.
 
@@ -15,7 +15,7 @@ from dotenv import load_dotenv
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 
 # Quick-start development settings - unsuitable for production
@@ -25,7 +25,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-7nzsi&hqw-840g2($$4o6-cgoj_kj+mc%jg6%(dpn@&i-=dz^l'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = False
 
 ALLOWED_HOSTS = []
 
@@ -39,23 +39,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'rest_framework',
     'social_django',
 
     'store.apps.StoreConfig',
 ]
 
-INTERNAL_IPS = [
-    '127.0.0.1',
-]
-
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
     'social_core.backends.github.GithubOAuth2',
 )
 
 MIDDLEWARE = [
+    'store.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,9 +59,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
-    'debug_toolbar_force.middleware.ForceDebugToolbarMiddleware',
 ]
 
 ROOT_URLCONF = 'books.urls'
@@ -105,15 +98,65 @@ password = os.getenv("PASSWORD")
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'books_store',
-        'USER': 'postgres',
+        'NAME': os.getenv('DB_NAME', 'books_store'),
+        'USER': os.getenv('DB_USER', 'postgres'),
         'PASSWORD': password,
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+    }
+}
+
+# Read replica (store.routers): BookViewSet and book_relation serve GET / HEAD from it.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+
+STORE_READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+# A user who wrote reads from the primary for this many seconds, longer than the replica lag.
+STORE_REPLICA_STICKY_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'books',
     }
 }
 
 
+# Request timing
+# Share of requests timed by store.timing.RequestTimingMiddleware (Server-Timing header, logs, histograms).
+
+STORE_TIMING_SAMPLE_RATE = 1.0
+
+
+# Background tasks (store.tasks)
+# ThreadPoolTaskQueue runs in process; DatabaseTaskQueue is durable and run by `manage.py run_tasks`.
+# Work enqueued again within `delay` seconds is coalesced into one run.
+
+STORE_TASK_QUEUE = {
+    'BACKEND': 'store.tasks.ThreadPoolTaskQueue',
+    'OPTIONS': {'workers': 4, 'delay': 1.0},
+}
+
+# Queue book counter recounts instead of updating the book row in every relation write.
+STORE_DEFERRED_COUNTERS = False
+
+
+# Write-behind buffer for like / bookmark toggles (store.write_buffer); None writes them in the request.
+# After a crash run `manage.py replay_relation_journal` before starting the workers again.
+# {'JOURNAL_DIR': BASE_DIR / 'var' / 'relation-journal', 'FLUSH_INTERVAL': 1.0, 'MAX_SIZE': 10000, 'FSYNC': False}
+
+STORE_RELATION_BUFFER = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -159,7 +202,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'store.renderers.FastJSONRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
@@ -0,0 +1,94 @@
+"""
+Production profile: no debug tooling, a shared cache (`CACHE_URL`), persistent
+health-checked database connections and an optional connection pool (`DB_POOL=1`, needs
+django-db-connection-pool).
+"""
+import os
+from importlib.util import find_spec
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+from books.settings.base import *  # noqa: F401,F403
+from books.settings.base import DATABASES
+
+DEBUG = False
+
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Set DJANGO_SECRET_KEY for the prod settings profile.')
+
+ALLOWED_HOSTS = [host for host in os.getenv('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+DATABASES = {
+    alias: {
+        **database,
+        # Keep each worker's connection for this many seconds instead of reconnecting per request.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        # Checked before a request reuses the connection (store.signals.check_connections).
+        'CONN_HEALTH_CHECKS': True,
+    }
+    for alias, database in DATABASES.items()
+}
+
+if os.getenv('DB_POOL') == '1':
+    if find_spec('dj_db_conn_pool') is None:
+        raise ImproperlyConfigured('DB_POOL=1 needs the django-db-connection-pool package.')
+    for database in DATABASES.values():
+        database.update({
+            'ENGINE': 'dj_db_conn_pool.backends.postgresql',
+            # The pool keeps the connections; Django hands them back after every request.
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': False,
+            'POOL_OPTIONS': {
+                'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', '10')),
+                'MAX_OVERFLOW': int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+                'RECYCLE': 600,
+                'PRE_PING': True,
+            },
+        })
+
+# The catalogue version, ETags, replica stickiness and timing histograms live in the cache, so
+# every worker has to share it: `memcached://host:port[,host:port]` (needs pymemcache) or
+# `redis://host:port/db` (needs django-redis).
+CACHE_URL = os.getenv('CACHE_URL')
+if not CACHE_URL:
+    raise ImproperlyConfigured('Set CACHE_URL to a memcached:// or redis:// URL for the prod settings profile.')
+cache_scheme = urlsplit(CACHE_URL).scheme
+if cache_scheme == 'memcached':
+    if find_spec('pymemcache') is None:
+        raise ImproperlyConfigured('A memcached:// CACHE_URL needs the pymemcache package.')
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': urlsplit(CACHE_URL).netloc.split(','),
+    }}
+elif cache_scheme in ('redis', 'rediss'):
+    if find_spec('django_redis') is None:
+        raise ImproperlyConfigured('A redis:// CACHE_URL needs the django-redis package.')
+    CACHES = {'default': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': CACHE_URL}}
+else:
+    raise ImproperlyConfigured(f'Unsupported CACHE_URL scheme {cache_scheme!r}: use memcached:// or redis://.')
+
+# Time a sample of requests, without exposing the numbers to clients.
+STORE_TIMING_SAMPLE_RATE = float(os.getenv('STORE_TIMING_SAMPLE_RATE', '0.05'))
+STORE_TIMING_HEADER = False
+
+# `STORE_TASK_QUEUE=db` keeps queued work in the database for `run_tasks` workers.
+if os.getenv('STORE_TASK_QUEUE') == 'db':
+    STORE_TASK_QUEUE = {
+        'BACKEND': 'store.tasks.DatabaseTaskQueue',
+        'OPTIONS': {'delay': float(os.getenv('STORE_TASK_DELAY', '1.0'))},
+    }
+STORE_DEFERRED_COUNTERS = os.getenv('STORE_DEFERRED_COUNTERS') == '1'
+
+# Only the worker that buffered a toggle can flush it before the user's next read, so the
+# buffer needs a single worker process (threads are fine).
+if os.getenv('STORE_RELATION_BUFFER') == '1':
+    if int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+        raise ImproperlyConfigured('STORE_RELATION_BUFFER=1 needs a single worker process (WEB_CONCURRENCY=1).')
+    STORE_RELATION_BUFFER = {
+        'JOURNAL_DIR': os.getenv('STORE_RELATION_JOURNAL_DIR', '/var/lib/books/relation-journal'),
+        'FLUSH_INTERVAL': float(os.getenv('STORE_RELATION_FLUSH_INTERVAL', '1.0')),
+        'MAX_SIZE': int(os.getenv('STORE_RELATION_BUFFER_SIZE', '10000')),
+        'FSYNC': os.getenv('STORE_RELATION_JOURNAL_FSYNC') == '1',
+    }
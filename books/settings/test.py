@@ -0,0 +1,23 @@
+"""
+Self-contained profile for the test suite and `bench_store`: SQLite, no debug tooling.
+"""
+from books.settings.base import *  # noqa: F401,F403
+from books.settings.base import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Stands in for a read replica; the routing tests turn on STORE_READ_REPLICA themselves.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+    },
+}
+
+STORE_READ_REPLICA = None
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
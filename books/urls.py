@@ -13,7 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-import debug_toolbar
+from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin
 from django.urls import path, include
@@ -22,5 +22,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('store.urls')),
     url('', include('social_django.urls', namespace='social')),
-    path('__debug__/', include(debug_toolbar.urls)),
 ]
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    import debug_toolbar
+
+    urlpatterns.append(path('__debug__/', include(debug_toolbar.urls)))
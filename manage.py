@@ -7,6 +7,9 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'books.settings')
+    if sys.argv[1:2] in (['test'], ['bench_store'], ['bench_concurrency']):
+        # Suites and benchmarks run offline on SQLite unless a profile is chosen explicitly.
+        os.environ.setdefault('BOOKS_SETTINGS_PROFILE', 'test')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,39 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from store.views import BookViewSet, UserBookRelationView
+
+
+def async_view(view):
+    """
+    Async wrapper of a sync view for ASGI.
+
+    Django 3.2 has no async ORM, and under ASGI it runs every sync view on one shared
+    thread (`thread_sensitive=True`), so requests are served one at a time. The wrapped view
+    runs in any free worker thread instead, rendered there, while the event loop keeps
+    accepting requests. Worker threads hold their own connections, so they are closed
+    or reused by the usual `CONN_MAX_AGE` rules around every call.
+    """
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False)(request, *args, **kwargs)
+
+    return wrapper
+
+
+book_list = async_view(BookViewSet.as_view({'get': 'list'}, basename='book-async'))
+book_detail = async_view(BookViewSet.as_view({'get': 'retrieve'}, basename='book-async'))
+book_relation = async_view(UserBookRelationView.as_view({'put': 'update', 'patch': 'partial_update'},
+                                                        basename='book_relation-async'))
@@ -0,0 +1,3 @@
+from store.benchmarks.concurrency import run_concurrency_benchmark
+from store.benchmarks.runner import SCENARIOS, compare_reports, run_benchmarks
+from store.benchmarks.seed import seed_catalogue
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from store.benchmarks.runner import percentile
+
+CONCURRENCY_ENDPOINTS = {
+    'sync': 'book-list',
+    'async': 'book-async-list',
+}
+
+
+class DatabaseLatency:
+    """
+    Execute wrapper that sleeps before every query, standing in for the network round trip
+    to a database server that in-process SQLite doesn't have.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        for connection in connections.all():
+            self.install(connection=connection)
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+async def _load(url, params, requests, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(number):
+        async with semaphore:
+            started = time.perf_counter()
+            # A distinct query string per request: the response cache would hide the views.
+            # (The Django 3.2 AsyncClient drops `data` on GET, so it goes into the path.)
+            response = await client.get(f'{url}?{urlencode({**params, "bench_request": number})}')
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(requests)))
+    return time.perf_counter() - started, timings
+
+
+def run_concurrency_benchmark(concurrency_levels=(1, 8, 32), requests=64, threads=8, db_latency_ms=5,
+                              params=None, log=None):
+    """
+    Load the sync and async book list through the ASGI handler of one process with `threads`
+    worker threads, at every concurrency level. Sync views share Django's single
+    thread-sensitive thread; async ones spread over the pool. Returns a JSON-serializable report.
+    """
+    params = {'page_size': 20, **(params or {})}
+    report = {
+        'meta': {'requests': requests, 'threads': threads, 'db_latency_ms': db_latency_ms},
+        'results': {},
+    }
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=threads))
+    try:
+        with DatabaseLatency(db_latency_ms / 1000):
+            for name, url_name in CONCURRENCY_ENDPOINTS.items():
+                results = {}
+                for concurrency in concurrency_levels:
+                    cache.clear()
+                    elapsed, timings = loop.run_until_complete(_load(reverse(url_name), params, requests, concurrency))
+                    results[str(concurrency)] = {
+                        'requests_per_s': round(requests / elapsed, 1),
+                        'p50_ms': round(percentile(timings, 0.50), 3),
+                        'p95_ms': round(percentile(timings, 0.95), 3),
+                    }
+                    if log:
+                        log(f'  {name:<6} concurrency {concurrency:>3} {results[str(concurrency)]}')
+                report['results'][name] = results
+    finally:
+        loop.close()
+    return report
@@ -0,0 +1,167 @@
+import json
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from store.benchmarks.seed import seed_catalogue
+from store.models import Book
+from store.pagination import KeysetPagination
+
+SCENARIOS = ('list', 'list_untimed', 'list_deep', 'list_cached', 'search', 'ordering', 'detail', 'relation_patch')
+# Run with request timing switched off; compared to their timed twin they show its overhead.
+UNTIMED_SCENARIOS = ('list_untimed',)
+SCALING_PAGE_SIZES = (10, 100)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_scenarios(client, user):
+    """
+    `{name: (method, url, params, body)}` for a seeded catalogue.
+    """
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    middle = book_ids[len(book_ids) // 2]
+    deep_cursor = KeysetPagination.make_cursor('id', book_ids[-(len(book_ids) // 10) - 1])
+    client.force_login(user)
+    return {
+        'list': ('get', reverse('book-list'), {'page_size': 20}, None),
+        'list_untimed': ('get', reverse('book-list'), {'page_size': 20}, None),
+        'list_deep': ('get', reverse('book-list'), {'page_size': 20, 'cursor': deep_cursor}, None),
+        'list_cached': ('get', reverse('book-list'), {'page_size': 20}, None),
+        'search': ('get', reverse('book-list'), {'page_size': 20, 'search': 'stone river'}, None),
+        'ordering': ('get', reverse('book-list'), {'page_size': 20, 'ordering': '-rating'}, None),
+        'detail': ('get', reverse('book-detail', args=(middle,)), {}, None),
+        'relation_patch': ('patch', reverse('userbookrelation-detail', args=(middle,)), {}, {'like': True}),
+    }
+
+
+def request(client, method, url, params, body):
+    if method == 'get':
+        response = client.get(url, data=params)
+    else:
+        response = getattr(client, method)(url, data=json.dumps(body), content_type='application/json')
+    assert response.status_code < 400, (url, response.status_code)
+    return response
+
+
+def measure(client, method, url, params, body, repeat, cached=False):
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        if not cached:
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            request(client, method, url, params, body)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(context.captured_queries)
+
+    if not cached:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        request(client, method, url, params, body)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def query_scaling(client, url, params, page_sizes=SCALING_PAGE_SIZES):
+    """
+    Query count of one list request per page size. Anything that differs is an N+1.
+    """
+    counts = {}
+    for page_size in page_sizes:
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            request(client, 'get', url, {**params, 'page_size': page_size}, None)
+        counts[str(page_size)] = len(context.captured_queries)
+    return counts
+
+
+def run_benchmarks(sizes, repeat=20, scenarios=SCENARIOS, seed=0, log=None):
+    """
+    Seed a catalogue of every size in turn into the current (test) database and measure
+    each scenario against it. Returns a JSON-serializable report.
+    """
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': repeat,
+        },
+        'results': {},
+    }
+    for size in sizes:
+        call_command('flush', interactive=False, verbosity=0)
+        started = time.perf_counter()
+        users = seed_catalogue(size, seed=seed)
+        if log:
+            log(f'Seeded {size} books in {time.perf_counter() - started:.1f}s')
+
+        client = Client()
+        available = build_scenarios(client, users.first())
+        results = {}
+        for name in scenarios:
+            method, url, params, body = available[name]
+            sample_rate = 0 if name in UNTIMED_SCENARIOS else 1
+            with override_settings(STORE_TIMING_SAMPLE_RATE=sample_rate):
+                results[name] = measure(client, method, url, params, body, repeat, cached=name == 'list_cached')
+            if log:
+                log(f'  {size:>7} {name:<15} {results[name]}')
+        for name in ('list', 'search', 'ordering'):
+            if name not in results:
+                continue
+            method, url, params, body = available[name]
+            results[name]['queries_by_page_size'] = query_scaling(client, url, params)
+        report['results'][str(size)] = results
+    return report
+
+
+def compare_reports(report, baseline, tolerance=None):
+    """
+    Regressions of `report` against `baseline`, as messages:
+
+    * any endpoint whose query count depends on the page size;
+    * any query count above the baseline;
+    * with a `tolerance`, p95 latency or peak memory more than `tolerance` above the
+      baseline. Off by default: timings and memory depend on the machine that ran them.
+    """
+    problems = []
+    for size, results in report['results'].items():
+        for name, result in results.items():
+            by_page_size = result.get('queries_by_page_size')
+            if by_page_size and len(set(by_page_size.values())) > 1:
+                problems.append(f'{size}/{name}: query count grows with page size {by_page_size}')
+
+            expected = baseline.get('results', {}).get(size, {}).get(name)
+            if not expected:
+                continue
+            if result['queries'] > expected['queries']:
+                problems.append(f'{size}/{name}: {result["queries"]} queries, baseline {expected["queries"]}')
+            if tolerance is None:
+                continue
+            for metric in ('p95_ms', 'peak_kib'):
+                if result[metric] > expected[metric] * (1 + tolerance):
+                    problems.append(f'{size}/{name}: {metric} {result[metric]}, baseline {expected[metric]}')
+    return problems
@@ -0,0 +1,52 @@
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from store.models import Book, UserBookRelation
+
+WORDS = ('rolling', 'stone', 'python', 'django', 'river', 'night', 'garden', 'winter', 'shadow', 'empire',
+         'silent', 'glass', 'ocean', 'iron', 'golden', 'forest', 'storm', 'paper', 'moon', 'city')
+
+
+def _readers_per_book(rng, books, max_readers, alpha):
+    # Pareto tail: most books have a handful of readers, a few have thousands.
+    return [min(max_readers, int(rng.paretovariate(alpha))) for _ in range(books)]
+
+
+@transaction.atomic
+def seed_catalogue(books, users=None, alpha=1.3, seed=0, batch_size=5000):
+    """
+    Fill an empty database with `books` synthetic books, `users` readers (books / 10 by
+    default) and relations whose per-book count follows a power law. Counters are rebuilt
+    at the end. Returns the created users.
+    """
+    rng = random.Random(seed)
+    users = users or max(50, books // 10)
+
+    User.objects.bulk_create(
+        (User(username=f'bench_{i}', first_name=f'First{i}', last_name=f'Last{i}') for i in range(users)),
+        batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith='bench_').values_list('id', flat=True))
+
+    Book.objects.bulk_create(
+        (Book(name=' '.join(rng.sample(WORDS, 3)) + f' {i}', price=rng.randint(100, 99999) / 100,
+              author_name=f'{rng.choice(WORDS).title()} Author {i % 997}', owner_id=rng.choice(user_ids))
+         for i in range(books)),
+        batch_size=batch_size)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+
+    relations = []
+    for book_id, readers in zip(book_ids, _readers_per_book(rng, len(book_ids), len(user_ids), alpha)):
+        for user_id in rng.sample(user_ids, readers):
+            relations.append(UserBookRelation(
+                user_id=user_id, book_id=book_id,
+                like=rng.random() < 0.6, in_bookmarks=rng.random() < 0.2,
+                rate=rng.randint(1, 5) if rng.random() < 0.5 else None))
+        if len(relations) >= batch_size:
+            UserBookRelation.objects.bulk_create(relations)
+            relations = []
+    UserBookRelation.objects.bulk_create(relations)
+
+    Book.objects.rebuild_counters()
+    return User.objects.filter(pk__in=user_ids)
@@ -0,0 +1,207 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+
+CATALOGUE_VERSION_KEY = 'store:catalogue:version'
+CATALOGUE_MODIFIED_KEY = 'store:catalogue:modified'
+CACHE_HITS_KEY = 'store:response:hits'
+CACHE_MISSES_KEY = 'store:response:misses'
+
+
+def get_catalogue_version():
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts at a version that
+        # still has cached responses stored under it.
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    cache.set(CATALOGUE_MODIFIED_KEY, time.time(), timeout=None)
+    try:
+        return cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        get_catalogue_version()
+        return cache.incr(CATALOGUE_VERSION_KEY)
+
+
+def get_catalogue_modified():
+    """
+    Time of the last catalogue write. Unknown (evicted) is reported as "now", which only
+    costs clients a full response.
+    """
+    modified = cache.get(CATALOGUE_MODIFIED_KEY)
+    if modified is None:
+        modified = time.time()
+        cache.add(CATALOGUE_MODIFIED_KEY, modified, timeout=None)
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def invalidate_catalogue():
+    """
+    Make every cached book response stale. The version is bumped right away and once more
+    after commit, so a response cached by a concurrent reader that still saw the old rows
+    can't outlive the transaction.
+    """
+    bump_catalogue_version()
+    transaction.on_commit(bump_catalogue_version)
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_cache_stats():
+    hits = cache.get(CACHE_HITS_KEY, 0)
+    misses = cache.get(CACHE_MISSES_KEY, 0)
+    return {'hits': hits, 'misses': misses}
+
+
+def reset_cache_stats():
+    cache.delete_many([CACHE_HITS_KEY, CACHE_MISSES_KEY])
+
+
+def normalized_query(request, personal=False):
+    """
+    The sorted query string. If the response depends on who asks, the user is added to it.
+    """
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    if personal:
+        params.append(('user', request.user.pk or ''))
+    return urlencode(params)
+
+
+def get_personal_params(view):
+    filterset_class = getattr(view, 'filterset_class', None)
+    return getattr(filterset_class, 'personal_filters', ())
+
+
+def is_personal_response(view, request):
+    """
+    Whether the response depends on who asks: a personal filter is used, or the view renders
+    per-user fields (`view.get_personal_fields()`) for a logged-in user.
+    """
+    personal_params = get_personal_params(view)
+    if any(key in personal_params for key in request.query_params):
+        return True
+    get_personal_fields = getattr(view, 'get_personal_fields', None)
+    return bool(get_personal_fields and request.user.is_authenticated and get_personal_fields())
+
+
+class CachedResponseMixin:
+    """
+    Caches the rendered bytes of `list` and `retrieve` responses under the normalized query
+    string and the catalogue version, so any write to the catalogue invalidates everything at once.
+    """
+    response_cache_timeout = 300
+    response_cache_prefix = 'store:response'
+    response_cache_headers = ()
+
+    def get_response_cache_key(self, request):
+        query = normalized_query(request, is_personal_response(self, request))
+        digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, '')
+        return f'{self.response_cache_prefix}:{self.basename}:{self.action}:{request.method}:' \
+               f'{get_catalogue_version()}:{lookup}:{digest}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            _incr(CACHE_HITS_KEY)
+            content, content_type, headers = cached
+            response = HttpResponse(content, content_type=content_type, headers=headers)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _incr(CACHE_MISSES_KEY)
+        self._response_cache_key = key
+        return handler(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def is_response_cacheable(self, request, response):
+        return True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if key is not None and response.status_code == 200 and hasattr(response, 'render') \
+                and self.is_response_cacheable(request, response):
+            response.render()
+            headers = {name: response[name] for name in self.response_cache_headers if name in response}
+            cache.set(key, (response.content, response['Content-Type'], headers), self.response_cache_timeout)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Answers `If-None-Match` / `If-Modified-Since` on `list` and `retrieve` with 304 before the
+    serializer or the annotated queryset runs. Lists are versioned by the catalogue version,
+    single books by their own `updated_at`; both ETags also cover the query string.
+    """
+
+    def get_list_validators(self, request):
+        version = get_catalogue_version()
+        query = normalized_query(request, is_personal_response(self, request))
+        digest = hashlib.sha1(f'{version}:{query}'.encode('utf-8')).hexdigest()
+        return f'"{digest}"', get_catalogue_modified()
+
+    def get_detail_validators(self, request):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            updated_at = self.queryset.model.objects.filter(**lookup).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            return None, None
+        if updated_at is None:
+            return None, None
+        etag = f'{self.kwargs[lookup_url_kwarg]}-{updated_at.timestamp():.6f}'
+        personal = is_personal_response(self, request)
+        if personal:
+            # The user's own relation can change without touching the book, but not the catalogue.
+            etag = f'{etag}-{get_catalogue_version()}'
+            updated_at = max(updated_at, get_catalogue_modified())
+        # `?fields=`, `?readers=`, ... and the user pick the representation.
+        query = normalized_query(request, personal)
+        if query:
+            etag = f'{etag}-{hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]}'
+        return f'"{etag}"', updated_at
+
+    def conditional_response(self, validators, handler, request, *args, **kwargs):
+        etag, last_modified = validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        last_modified_ts = int(last_modified.timestamp())
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified_ts)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified_ts)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.get_list_validators, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(self.get_detail_validators, super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,47 @@
+from django.db.models import DecimalField, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+COUNTER_FIELDS = ('likes_count', 'bookmarks_count', 'rating_sum', 'rating_count')
+
+
+def relation_state(like=False, in_bookmarks=False, rate=None):
+    return {
+        'likes_count': int(bool(like)),
+        'bookmarks_count': int(bool(in_bookmarks)),
+        'rating_sum': rate or 0,
+        'rating_count': int(rate is not None),
+    }
+
+
+def relation_deltas(old, new):
+    """
+    Difference between two `relation_state()` dicts; `None` stands for "no relation row".
+    Only non-zero deltas are returned.
+    """
+    old = old or relation_state()
+    new = new or relation_state()
+    deltas = {field: new[field] - old[field] for field in COUNTER_FIELDS}
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def rating_expression(rating_sum, rating_count):
+    """
+    Average rating as a SQL expression, 0 for books nobody has rated yet.
+    """
+    average = Cast(rating_sum, FloatField()) / NullIf(rating_count, Value(0))
+    return Cast(Coalesce(average, Value(0.0)), DecimalField(max_digits=3, decimal_places=2))
+
+
+def counter_updates(deltas):
+    """
+    UPDATE kwargs shifting the stored counters by `deltas`. The arithmetic happens in SQL,
+    so concurrent writers can't overwrite each other's increments.
+    """
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if 'rating_sum' in deltas or 'rating_count' in deltas:
+        # The right-hand side of SET sees the old row, so apply the deltas here as well.
+        updates['rating'] = rating_expression(
+            F('rating_sum') + deltas.get('rating_sum', 0),
+            F('rating_count') + deltas.get('rating_count', 0),
+        )
+    return updates
@@ -0,0 +1,74 @@
+from django.db import connections
+from rest_framework.response import Response
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_HEADERS = ('X-Total-Count', 'X-Total-Count-Exact')
+
+
+def count_rows(queryset):
+    """
+    `COUNT(*)` of `queryset` without its ordering, annotations, related-object joins or
+    prefetches. Filters on annotations stay: they are compiled into the WHERE clause.
+    """
+    queryset = queryset.order_by().select_related(None).prefetch_related(None)
+    if not any(annotation.contains_aggregate for annotation in queryset.query.annotations.values()):
+        queryset.query.annotations = {}
+    return queryset.count()
+
+
+def estimate_count(model, using):
+    """
+    Row count of `model`'s table from the PostgreSQL planner statistics, or `None` where
+    there are none (other databases, a table never analyzed).
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class CountMixin:
+    """
+    `HEAD` or `?count_only=1` on `list` answers with the size of the filtered, searched
+    result set instead of a page, from a single stripped `COUNT(*)`.
+
+    `?count_only=estimate` may use the planner estimate when nothing is filtered and the
+    table has at least `count_estimate_min` rows. `X-Total-Count-Exact` says which one it is.
+    """
+    count_query_param = 'count_only'
+    count_estimate_min = 10000
+
+    def get_count_mode(self, request):
+        value = request.query_params.get(self.count_query_param, '').lower()
+        if value == COUNT_ESTIMATE:
+            return COUNT_ESTIMATE
+        if value in ('1', 'true') or request.method == 'HEAD':
+            return COUNT_EXACT
+        return None
+
+    def get_count(self, queryset, mode):
+        """
+        `(count, exact)` of the filtered `queryset`.
+        """
+        if mode == COUNT_ESTIMATE and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.count_estimate_min:
+                return estimate, False
+        return count_rows(queryset), True
+
+    def list(self, request, *args, **kwargs):
+        mode = self.get_count_mode(request)
+        if mode is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.queryset.model._default_manager.all())
+        count, exact = self.get_count(queryset, mode)
+        # The server drops the body of a HEAD response; the headers carry the count.
+        headers = dict(zip(COUNT_HEADERS, (str(count), 'true' if exact else 'false')))
+        return Response({'count': count, 'exact': exact}, headers=headers)
@@ -0,0 +1,178 @@
+import decimal
+from collections import defaultdict
+
+from django.http import StreamingHttpResponse
+
+from store.models import Book, UserBookRelation
+from store.serializers import BookSerializer, READERS_ALL, READERS_TOP
+from store.timing import timed
+
+
+def decimal_formatter(model_field):
+    """
+    `serializers.DecimalField.to_representation` for one model field, as a plain function.
+    """
+    exponent = decimal.Decimal('.1') ** model_field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = model_field.max_digits
+
+    def format_decimal(value):
+        if value is None:
+            return None
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, context=context))
+    return format_decimal
+
+
+def optional_text(value):
+    return '' if value is None else value
+
+
+class BookListFastSerializer:
+    """
+    Read-only stand-in for `BookSerializer(many=True)` on list pages. Rows come from
+    `.values()` and the readers of the whole page from one `values_list()` query, so no model
+    instances or serializer fields are built per row. The output is the same, key for key.
+    """
+    serializer_class = BookSerializer
+
+    # Serializer field -> (values() column, formatter or None).
+    columns = {
+        'id': ('id', None),
+        'name': ('name', None),
+        'price': ('price', decimal_formatter(Book._meta.get_field('price'))),
+        'author_name': ('author_name', None),
+        'annotated_likes': ('likes_count', None),
+        'rating': ('rating', decimal_formatter(Book._meta.get_field('rating'))),
+        'rating_count': ('rating_count', None),
+        'owner_name': ('owner__username', optional_text),
+        'readers_count': ('readers_count', None),
+    }
+    # Serializer field -> method that fetches it for a whole page, `{book_id: value}`.
+    page_fields = {
+        'readers': 'get_readers',
+        'my_relation': 'get_my_relations',
+    }
+
+    def __init__(self, context):
+        self.mode, self.limit = context.get('readers', (READERS_ALL, None))
+        self.user = getattr(context.get('request'), 'user', None)
+        self.fields = list(self.serializer_class(context=context).fields)
+
+    def is_supported(self):
+        return all(name in self.columns or name in self.page_fields for name in self.fields)
+
+    def values(self, queryset):
+        """
+        The list queryset as dicts with every column the fields need, plus its annotations
+        and ordering fields so the paginator can still read its position.
+        """
+        names = [self.columns[name][0] for name in self.fields if name in self.columns]
+        ordering = [term.lstrip('-') for term in queryset.query.order_by if isinstance(term, str)]
+        for name in ['id', *queryset.query.annotations, *ordering]:
+            if name not in names:
+                names.append(name)
+        return queryset.prefetch_related(None).values(*names)
+
+    def get_readers(self, book_ids):
+        if self.mode == READERS_TOP:
+            relations = UserBookRelation.objects.first_per_book(book_ids, self.limit)
+        else:
+            relations = UserBookRelation.objects.filter(book_id__in=book_ids)
+
+        readers = defaultdict(list)
+        rows = relations.order_by('id').values_list('book_id', 'user__first_name', 'user__last_name')
+        for book_id, first_name, last_name in rows:
+            readers[book_id].append({'first_name': first_name, 'last_name': last_name})
+        return readers
+
+    def get_my_relations(self, book_ids):
+        relations = defaultdict(lambda: None)
+        rows = UserBookRelation.objects.filter(user=self.user, book_id__in=book_ids)\
+            .values_list('book_id', 'like', 'in_bookmarks', 'rate')
+        for book_id, like, in_bookmarks, rate in rows:
+            relations[book_id] = {'like': like, 'in_bookmarks': in_bookmarks, 'rate': rate}
+        return relations
+
+    def iter_representation(self, rows):
+        """
+        Lazily render `rows`; the page fields of all of them are fetched up front.
+        """
+        book_ids = [row['id'] for row in rows]
+        pages = {name: getattr(self, method)(book_ids)
+                 for name, method in self.page_fields.items() if name in self.fields}
+        # `None` in place of a column marks a page field; the order is the serializer's.
+        fields = [(name, *self.columns.get(name, (None, None))) for name in self.fields]
+        return (self.represent(row, fields, pages) for row in rows)
+
+    def represent(self, row, fields, pages):
+        item = {}
+        for name, column, formatter in fields:
+            if column is None:
+                item[name] = pages[name][row['id']]
+            elif formatter is None:
+                item[name] = row[column]
+            else:
+                item[name] = formatter(row[column])
+        return item
+
+    def to_representation(self, rows):
+        return list(self.iter_representation(rows))
+
+
+class FastListMixin:
+    """
+    Serves `list` through `fast_list_serializer_class` whenever it covers every field the
+    regular serializer would render; anything else takes the normal path.
+
+    With `?stream=true` a paginated page is sent as a streaming response, item by item, by
+    renderers that implement `render_stream`.
+    """
+    fast_list_serializer_class = None
+    stream_query_param = 'stream'
+    stream_results_key = 'results'
+
+    def get_fast_list_serializer(self):
+        if self.fast_list_serializer_class is None:
+            return None
+        serializer = self.fast_list_serializer_class(self.get_serializer_context())
+        return serializer if serializer.is_supported() else None
+
+    def get_stream_renderer(self, request):
+        if request.query_params.get(self.stream_query_param, '').lower() not in ('1', 'true'):
+            return None
+        renderer = request.accepted_renderer
+        if not hasattr(renderer, 'render_stream'):
+            return None
+        if renderer.get_indent(request.accepted_media_type, self.get_renderer_context()) is not None:
+            return None
+        return renderer
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_fast_list_serializer()
+        renderer = self.get_stream_renderer(request)
+        if serializer is None and renderer is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if serializer is not None:
+            queryset = serializer.values(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return super().list(request, *args, **kwargs)
+
+        with timed('serialize'):
+            if serializer is not None:
+                items = serializer.iter_representation(page)
+            else:
+                child = self.get_serializer(many=True).child
+                items = (child.to_representation(instance) for instance in page)
+            if renderer is None:
+                items = list(items)
+        if renderer is None:
+            return self.get_paginated_response(items)
+        data = self.paginator.get_paginated_response([]).data
+        stream = renderer.render_stream(data, self.stream_results_key, items,
+                                        request.accepted_media_type, self.get_renderer_context())
+        return StreamingHttpResponse(stream, content_type=renderer.media_type)
@@ -0,0 +1,37 @@
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework as filters
+
+from store.models import Book, UserBookRelation
+
+
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    pass
+
+
+class BookFilterSet(filters.FilterSet):
+    """
+    Every filter is one indexed predicate on `store_book`: `price` and its range on
+    `(price, id)`, `author_name__in` on `(author_name, id)`, `owner` on the owner FK and the
+    `*_by_me` flags an `EXISTS` on the unique `(user, book)` relation.
+    """
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+    author_name__in = CharInFilter(field_name='author_name', lookup_expr='in')
+    owner = filters.NumberFilter(field_name='owner')
+    liked_by_me = filters.BooleanFilter(method='filter_by_me')
+    bookmarked_by_me = filters.BooleanFilter(method='filter_by_me')
+
+    # Filters whose result depends on the requesting user.
+    personal_filters = ('liked_by_me', 'bookmarked_by_me')
+    by_me_fields = {'liked_by_me': 'like', 'bookmarked_by_me': 'in_bookmarks'}
+
+    class Meta:
+        model = Book
+        fields = ('price',)
+
+    def filter_by_me(self, queryset, name, value):
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return queryset.none() if value else queryset
+        relations = UserBookRelation.objects.filter(book=OuterRef('pk'), user=user, **{self.by_me_fields[name]: True})
+        return queryset.filter(Exists(relations) if value else ~Exists(relations))
@@ -0,0 +1,30 @@
+from django.core.cache import cache
+
+from store.cache import get_catalogue_version
+from store.models import Book
+
+# `?by=` value -> stored counter. Each has a `(counter, id)` index, and the counters are
+# shifted in place by every relation change, so the index is the ranked list.
+LEADERBOARDS = {
+    'likes': 'likes_count',
+    'rating': 'rating',
+    'bookmarks': 'bookmarks_count',
+}
+LEADERBOARD_KEY_PREFIX = 'store:top'
+LEADERBOARD_SIZE = 100
+LEADERBOARD_TIMEOUT = 300
+
+
+def get_leaderboard(by, limit=LEADERBOARD_SIZE):
+    """
+    Ids of the `limit` best books by `by`, best first; books that score zero are left out.
+    The top `LEADERBOARD_SIZE` ids are read from the index once per catalogue version.
+    """
+    key = f'{LEADERBOARD_KEY_PREFIX}:{by}:{get_catalogue_version()}'
+    ids = cache.get(key)
+    if ids is None:
+        field = LEADERBOARDS[by]
+        ids = list(Book.objects.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', '-id')
+                   .values_list('id', flat=True)[:LEADERBOARD_SIZE])
+        cache.set(key, ids, LEADERBOARD_TIMEOUT)
+    return ids[:limit]
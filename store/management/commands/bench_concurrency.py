@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+
+from store.benchmarks import run_concurrency_benchmark, seed_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync and async book list under concurrent load in one ASGI process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000, help='Catalogue size to seed.')
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32],
+                            help='Numbers of requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=64, help='Requests per endpoint and level.')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads of the process.')
+        parser.add_argument('--db-latency-ms', type=float, default=5,
+                            help='Simulated database round trip added to every query.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        # Everything runs in a throwaway test database, never the configured one.
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            seed_catalogue(options['books'])
+            report = run_concurrency_benchmark(options['concurrency'], requests=options['requests'],
+                                               threads=options['threads'], db_latency_ms=options['db_latency_ms'],
+                                               log=self.stdout.write)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f'Report written to {options["output"]}')
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+
+from store.benchmarks import SCENARIOS, compare_reports, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the store API (query counts, p50/p95 latency, peak memory) on synthetic catalogues.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                            help='Catalogue sizes (number of books) to seed and measure.')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per scenario.')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help='Only run these scenarios.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='Fail if the report regresses against this JSON report.')
+        parser.add_argument('--tolerance', type=float,
+                            help='Also fail when p95 latency or peak memory grows by more than this fraction '
+                                 'over the baseline. Only meaningful against a baseline from the same machine.')
+
+    def handle(self, *args, **options):
+        # Everything runs in a throwaway test database, never the configured one.
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            report = run_benchmarks(options['sizes'], repeat=options['repeat'],
+                                    scenarios=options['scenarios'] or SCENARIOS, log=self.stdout.write)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f'Report written to {options["output"]}')
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+        problems = compare_reports(report, baseline, options['tolerance'])
+        if problems:
+            raise CommandError('Benchmark regressions:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from store.timing import METRICS, OVERFLOW_BUCKET, get_timing_histograms, histograms, metric_buckets, \
+    reset_timing_histograms
+
+
+def bucket_percentile(buckets, metric, fraction):
+    """
+    Upper bound of the bucket holding the `fraction` percentile.
+    """
+    total = sum(buckets.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in (*map(str, metric_buckets(metric)), OVERFLOW_BUCKET):
+        seen += buckets.get(bucket, 0)
+        if seen >= fraction * total:
+            return bucket
+    return OVERFLOW_BUCKET
+
+
+class Command(BaseCommand):
+    help = 'Print the per-route request timing histograms recorded by RequestTimingMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw histograms as JSON.')
+        parser.add_argument('--reset', action='store_true', help='Clear the histograms after printing them.')
+
+    def handle(self, *args, reset=False, **options):
+        histograms.flush()
+        report = get_timing_histograms()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif not report:
+            self.stdout.write('No timings recorded.')
+        else:
+            self.stdout.write(f'{"route":<40} {"metric":<10} {"count":>7} {"mean":>9} {"p50<=":>7} {"p95<=":>7}')
+            for route, stats in report.items():
+                for metric in METRICS:
+                    mean = stats[metric]['sum'] / stats['count'] if stats['count'] else 0
+                    p50 = bucket_percentile(stats[metric]['buckets'], metric, 0.50) or '-'
+                    p95 = bucket_percentile(stats[metric]['buckets'], metric, 0.95) or '-'
+                    self.stdout.write(f'{route:<40} {metric:<10} {stats["count"]:>7} {mean:>9.2f} {p50:>7} {p95:>7}')
+
+        if reset:
+            reset_timing_histograms()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like, bookmark and rating counters of books from their relations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='Only rebuild these books.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of books updated per transaction.')
+
+    def handle(self, *args, book_ids=None, batch_size=5000, **options):
+        books = Book.objects.order_by('pk')
+        if book_ids:
+            books = books.filter(pk__in=book_ids)
+
+        updated = 0
+        last_pk = 0
+        while True:
+            # Walk the table in primary key ranges so each batch is one short UPDATE.
+            pks = list(books.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Book.objects.filter(pk__in=pks).rebuild_counters()
+            last_pk = pks[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} books'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.write_buffer import get_relation_buffer
+
+
+class Command(BaseCommand):
+    help = 'Apply the relation writes journaled by a write buffer that exited without flushing them.'
+
+    def handle(self, *args, **options):
+        buffer = get_relation_buffer()
+        if buffer is None:
+            raise CommandError('STORE_RELATION_BUFFER is not configured.')
+        count = buffer.recover()
+        self.stdout.write(self.style.SUCCESS(f'Replayed {count} relations'))
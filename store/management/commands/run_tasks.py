@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.tasks import DatabaseTaskQueue, get_task_queue
+
+
+class Command(BaseCommand):
+    help = 'Run the tasks queued in the database (STORE_TASK_QUEUE with DatabaseTaskQueue).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due tasks and exit.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of tasks claimed at a time.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when no task is due.')
+
+    def handle(self, *args, once=False, batch_size=100, interval=1.0, **options):
+        queue = get_task_queue()
+        if not isinstance(queue, DatabaseTaskQueue):
+            raise CommandError('STORE_TASK_QUEUE does not use DatabaseTaskQueue.')
+
+        total = 0
+        while True:
+            count = queue.run_pending(batch_size)
+            total += count
+            if once and not count:
+                break
+            if not count:
+                time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} tasks'))
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:07
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+
+    def relations(expression, **filters):
+        subquery = UserBookRelation.objects.filter(book=OuterRef('pk'), **filters)\
+            .order_by().values('book').annotate(value=expression).values('value')
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    Book.objects.update(
+        likes_count=relations(Count('pk'), like=True),
+        bookmarks_count=relations(Count('pk'), in_bookmarks=True),
+        rating_sum=relations(Sum('rate'), rate__isnull=False),
+        rating_count=relations(Count('pk'), rate__isnull=False),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_alter_userbookrelation_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='bookmarks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
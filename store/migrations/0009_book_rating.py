@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:08
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def fill_rating(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    average = Cast(F('rating_sum'), FloatField()) / NullIf(F('rating_count'), Value(0))
+    Book.objects.update(rating=Cast(Coalesce(average, Value(0.0)), models.DecimalField(max_digits=3, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_book_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating', 'id'], name='store_book_rating_id_idx'),
+        ),
+        migrations.RunPython(fill_rating, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE store_book_fts USING fts5("
+    "name, author_name, content='store_book', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER store_book_fts_insert AFTER INSERT ON store_book BEGIN "
+    "INSERT INTO store_book_fts(rowid, name, author_name) VALUES (new.id, new.name, new.author_name); "
+    "END",
+    "CREATE TRIGGER store_book_fts_delete AFTER DELETE ON store_book BEGIN "
+    "INSERT INTO store_book_fts(store_book_fts, rowid, name, author_name) "
+    "VALUES ('delete', old.id, old.name, old.author_name); "
+    "END",
+    "CREATE TRIGGER store_book_fts_update AFTER UPDATE OF name, author_name ON store_book BEGIN "
+    "INSERT INTO store_book_fts(store_book_fts, rowid, name, author_name) "
+    "VALUES ('delete', old.id, old.name, old.author_name); "
+    "INSERT INTO store_book_fts(rowid, name, author_name) VALUES (new.id, new.name, new.author_name); "
+    "END",
+    "INSERT INTO store_book_fts(store_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS store_book_fts_update",
+    "DROP TRIGGER IF EXISTS store_book_fts_delete",
+    "DROP TRIGGER IF EXISTS store_book_fts_insert",
+    "DROP TABLE IF EXISTS store_book_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE store_book ADD COLUMN search_vector tsvector",
+    "UPDATE store_book SET search_vector = to_tsvector('pg_catalog.simple', "
+    "coalesce(name, '') || ' ' || coalesce(author_name, ''))",
+    "CREATE TRIGGER store_book_search_vector_update BEFORE INSERT OR UPDATE OF name, author_name "
+    "ON store_book FOR EACH ROW "
+    "EXECUTE PROCEDURE tsvector_update_trigger(search_vector, 'pg_catalog.simple', name, author_name)",
+    "CREATE INDEX store_book_search_vector_idx ON store_book USING gin (search_vector)",
+    "CREATE INDEX store_book_name_trgm_idx ON store_book USING gin (upper(name) gin_trgm_ops)",
+    "CREATE INDEX store_book_author_name_trgm_idx ON store_book USING gin (upper(author_name) gin_trgm_ops)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS store_book_author_name_trgm_idx",
+    "DROP INDEX IF EXISTS store_book_name_trgm_idx",
+    "DROP INDEX IF EXISTS store_book_search_vector_idx",
+    "DROP TRIGGER IF EXISTS store_book_search_vector_update ON store_book",
+    "ALTER TABLE store_book DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def sqlite_has_trigram(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.store_fts_probe USING fts5(value, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.store_fts_probe")
+    return True
+
+
+def run(statements, schema_editor):
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run(POSTGRESQL_FORWARD, schema_editor)
+    elif vendor == 'sqlite' and sqlite_has_trigram(schema_editor):
+        run(SQLITE_FORWARD, schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run(POSTGRESQL_BACKWARD, schema_editor)
+    elif vendor == 'sqlite':
+        run(SQLITE_BACKWARD, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
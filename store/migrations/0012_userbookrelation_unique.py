@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:14
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keep the newest relation of every (user, book) pair and recount the affected books,
+    whose counters the duplicates inflated.
+    """
+    Book = apps.get_model('store', 'Book')
+    UserBookRelation = apps.get_model('store', 'UserBookRelation')
+
+    duplicates = UserBookRelation.objects.values('user', 'book').annotate(rows=Count('id'), keep=Max('id'))\
+        .filter(rows__gt=1)
+    book_ids = set()
+    for duplicate in duplicates.iterator():
+        UserBookRelation.objects.filter(user=duplicate['user'], book=duplicate['book'])\
+            .exclude(id=duplicate['keep']).delete()
+        book_ids.add(duplicate['book'])
+    if not book_ids:
+        return
+
+    def relations(expression, **filters):
+        subquery = UserBookRelation.objects.filter(book=OuterRef('pk'), **filters)\
+            .order_by().values('book').annotate(value=expression).values('value')
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+    Book.objects.filter(pk__in=book_ids).update(
+        likes_count=relations(Count('pk'), like=True),
+        bookmarks_count=relations(Count('pk'), in_bookmarks=True),
+        rating_sum=relations(Sum('rate'), rate__isnull=False),
+        rating_count=relations(Count('pk'), rate__isnull=False),
+    )
+    # The average is refreshed from the recounted columns.
+    for book in Book.objects.filter(pk__in=book_ids).only('rating_sum', 'rating_count'):
+        book.rating = round(book.rating_sum / book.rating_count, 2) if book.rating_count else 0
+        book.save(update_fields=['rating'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_book_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userbookrelation',
+            constraint=models.UniqueConstraint(fields=('user', 'book'), name='store_userbookrelation_user_book_uniq'),
+        ),
+    ]
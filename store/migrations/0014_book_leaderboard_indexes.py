@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_book_access_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['likes_count', 'id'], name='store_book_likes_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['bookmarks_count', 'id'], name='store_book_bookmarks_id_idx'),
+        ),
+    ]
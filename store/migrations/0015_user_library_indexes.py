@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_book_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('like', True)), fields=['user', 'id'], name='store_ubr_user_liked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('in_bookmarks', True)), fields=['user', 'id'], name='store_ubr_user_bookmarked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbookrelation',
+            index=models.Index(condition=models.Q(('rate__isnull', False)), fields=['user', 'id'], name='store_ubr_user_rated_idx'),
+        ),
+    ]
@@ -1,5 +1,57 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Now
+
+from store.cache import invalidate_catalogue
+from store.counters import counter_updates, rating_expression, relation_deltas, relation_state
+from store.tasks import defer, task
+
+
+class BookQuerySet(models.QuerySet):
+    def apply_counter_deltas(self, deltas, touch=False):
+        """
+        Shift the stored counters by `deltas` and mark the books as modified. With `touch`
+        the books are marked even if no counter changed, e.g. when a reader was added.
+        """
+        if not deltas and not touch:
+            return 0
+        return self.update(updated_at=Now(), **counter_updates(deltas))
+
+    def apply_counter_changes(self, changes):
+        """
+        Apply `{book_id: (deltas, touch)}` for many books. Books sharing the same change are
+        shifted by a single UPDATE, so a batch of likes costs one statement, not one per book.
+        """
+        groups = defaultdict(list)
+        for book_id, (deltas, touch) in changes.items():
+            groups[tuple(sorted(deltas.items())), touch].append(book_id)
+        for (deltas, touch), book_ids in groups.items():
+            self.filter(pk__in=book_ids).apply_counter_deltas(dict(deltas), touch=touch)
+
+    def rebuild_counters(self):
+        """
+        Recompute the stored counters from `UserBookRelation` in a single UPDATE.
+        """
+        def relations(expression, **filters):
+            subquery = UserBookRelation.objects.filter(book=OuterRef('pk'), **filters)\
+                .order_by().values('book').annotate(value=expression).values('value')
+            return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+        rating_sum = relations(Sum('rate'), rate__isnull=False)
+        rating_count = relations(Count('pk'), rate__isnull=False)
+        return self.update(
+            likes_count=relations(Count('pk'), like=True),
+            bookmarks_count=relations(Count('pk'), in_bookmarks=True),
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating=rating_expression(rating_sum, rating_count),
+            updated_at=Now(),
+        )
 
 
 class Book(models.Model):
@@ -8,10 +60,259 @@ class Book(models.Model):
     author_name = models.CharField(max_length=255)
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='my_books')
     readers = models.ManyToManyField(User, through='UserBookRelation', related_name='books')
+    likes_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rating', 'id'], name='store_book_rating_id_idx'),
+            models.Index(fields=['price', 'id'], name='store_book_price_id_idx'),
+            models.Index(fields=['author_name', 'id'], name='store_book_author_id_idx'),
+            models.Index(fields=['likes_count', 'id'], name='store_book_likes_id_idx'),
+            models.Index(fields=['bookmarks_count', 'id'], name='store_book_bookmarks_id_idx'),
+        ]
 
     def __str__(self):
         return f"Id {self.id}: {self.name}"
 
+
+def deferred_counters():
+    """
+    With `STORE_DEFERRED_COUNTERS` relation writes leave the book row alone and queue a
+    recount instead, so bursts on a hot book don't queue up on its row lock.
+    """
+    return getattr(settings, 'STORE_DEFERRED_COUNTERS', False)
+
+
+@task
+def recount_book(book_id):
+    Book.objects.filter(pk=book_id).rebuild_counters()
+    invalidate_catalogue()
+
+
+# `?kind=` of a user's library -> the relations it lists. Each has a partial index.
+LIBRARY_KINDS = {
+    'liked': Q(like=True),
+    'bookmarked': Q(in_bookmarks=True),
+    'rated': Q(rate__isnull=False),
+}
+
+
+class UserBookRelationQuerySet(models.QuerySet):
+    STATE_FIELDS = ('like', 'in_bookmarks', 'rate')
+
+    def library(self, user, kind):
+        """
+        The relations of `user` that put a book in its `kind` library, with the book.
+        """
+        return self.filter(LIBRARY_KINDS[kind], user=user).select_related('book')
+
+    def first_per_book(self, book_ids, limit):
+        """
+        The first `limit` relations (by id) of each of `book_ids`: a `UNION ALL` of per-book
+        `LIMIT` subqueries, so every book reads only its first rows off the book index.
+        """
+        book_ids = list(book_ids)
+        if not book_ids:
+            return self.none()
+        qn = connections[self.db].ops.quote_name
+        table, pk, book = qn(self.model._meta.db_table), qn('id'), qn('book_id')
+        # Wrapped in derived tables: a compound select can't LIMIT its parts directly.
+        sql = ' UNION ALL '.join(
+            f'SELECT {pk} FROM (SELECT {pk} FROM {table} WHERE {book} = %s ORDER BY {pk} LIMIT %s) AS top_{i}'
+            for i in range(len(book_ids)))
+        params = [param for book_id in book_ids for param in (book_id, limit)]
+        return self.filter(pk__in=RawSQL(sql, params))
+
+    def upsert(self, user, book_id, **values):
+        """
+        Create or update the relation of `user` to a book with a single
+        `INSERT ... ON CONFLICT (user_id, book_id) DO UPDATE` and shift the book counters
+        (or queue their recount, see `deferred_counters`). Returns the saved relation.
+
+        The row's previous state, needed for the counter deltas, is read under a row lock
+        in the same transaction.
+        """
+        book_id = int(book_id)
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            old_state = self.select_for_update().filter(user=user, book_id=book_id)\
+                .values_list(*self.STATE_FIELDS).first()
+            if old_state is None and not Book.objects.using(self.db).filter(pk=book_id).exists():
+                raise Book.DoesNotExist(f'Book {book_id} does not exist')
+
+            if connection.vendor in ('postgresql', 'sqlite'):
+                relation, inserted = self._upsert(connection, user, book_id, values)
+            else:
+                relation, inserted = self._get_and_save(user, book_id, values, exists=old_state is not None)
+
+            if old_state is not None:
+                old_state = relation_state(*old_state)
+            if deferred_counters():
+                defer(recount_book, book_id)
+            elif inserted is False and old_state is None:
+                # Another transaction inserted the row between our read and our upsert, so the
+                # delta against "no row" would be wrong. Recount this book instead.
+                Book.objects.using(self.db).filter(pk=book_id).rebuild_counters()
+            else:
+                Book.objects.using(self.db).filter(pk=book_id).apply_counter_deltas(
+                    relation_deltas(old_state, relation._saved_state), touch=old_state is None)
+        return relation
+
+    def _upsert(self, connection, user, book_id, values):
+        qn = connection.ops.quote_name
+        defaults = {field: self.model._meta.get_field(field).get_default() for field in self.STATE_FIELDS}
+        row = {'user_id': user.pk, 'book_id': book_id, **defaults, **values}
+        # An empty PATCH still has to return the row, so it "updates" book_id to itself.
+        updated = [field for field in self.STATE_FIELDS if field in values] or ['book_id']
+        returning = ['id', *self.STATE_FIELDS]
+        if connection.vendor == 'postgresql':
+            returning.append('(xmax = 0)')
+
+        sql = 'INSERT INTO {table} ({columns}) VALUES ({placeholders}) ' \
+              'ON CONFLICT ({user_id}, {book_id}) DO UPDATE SET {updates} RETURNING {returning}'.format(
+                  table=qn(self.model._meta.db_table),
+                  columns=', '.join(qn(column) for column in row),
+                  placeholders=', '.join(['%s'] * len(row)),
+                  user_id=qn('user_id'),
+                  book_id=qn('book_id'),
+                  updates=', '.join(f'{qn(field)} = EXCLUDED.{qn(field)}' for field in updated),
+                  returning=', '.join(qn(column) if column.isidentifier() else column for column in returning),
+              )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, list(row.values()))
+            pk, *state = cursor.fetchone()
+
+        inserted = bool(state.pop()) if connection.vendor == 'postgresql' else None
+        state = {field: self.model._meta.get_field(field).to_python(value)
+                 for field, value in zip(self.STATE_FIELDS, state)}
+        relation = self.model(pk=pk, user=user, book_id=book_id, **state)
+        relation._state.adding = False
+        relation._state.db = self.db
+        relation._saved_state = relation.counter_state()
+        return relation, inserted
+
+    def _get_and_save(self, user, book_id, values, exists):
+        # Databases without ON CONFLICT; the caller holds the row lock and owns the counters.
+        if exists:
+            relation = self.get(user=user, book_id=book_id)
+            for field, value in values.items():
+                setattr(relation, field, value)
+        else:
+            relation = self.model(user=user, book_id=book_id, **values)
+        models.Model.save(relation, using=self.db)
+        relation._saved_state = relation.counter_state()
+        return relation, not exists
+
+    def bulk_apply(self, user, changes):
+        """
+        Create or update the relations of `user` from `{book_id: {field: value}}` and keep the
+        book counters in step: one SELECT, one INSERT, one `bulk_update` and one counter
+        UPDATE per distinct change, all in one transaction. Returns the relations.
+
+        Rows another transaction inserts after the SELECT are skipped by the INSERT, then
+        locked and updated like the rows found by the SELECT.
+        """
+        with transaction.atomic(using=self.db):
+            existing = self._lock_relations(user, changes)
+            to_create, to_update, counter_changes = [], [], {}
+            for book_id, values in changes.items():
+                relation = existing.get(book_id)
+                if relation is None:
+                    relation = self.model(user=user, book_id=book_id, **values)
+                    relation._saved_state = relation.counter_state()
+                    to_create.append(relation)
+                    counter_changes[book_id] = (relation_deltas(None, relation._saved_state), True)
+                else:
+                    self._change_relation(relation, values, to_update, counter_changes)
+
+            inserted = self._insert_new(to_create)
+            recount = set()
+            if inserted is None:
+                # The database can't say which rows it inserted: recount those books instead.
+                inserted = set()
+                recount = {relation.book_id for relation in to_create}
+            existing.update((relation.book_id, relation) for relation in to_create
+                            if relation.book_id in inserted)
+            conflicted = [relation.book_id for relation in to_create if relation.book_id not in inserted]
+            if conflicted:
+                for book_id, relation in self._lock_relations(user, conflicted).items():
+                    existing[book_id] = relation
+                    del counter_changes[book_id]
+                    self._change_relation(relation, changes[book_id], to_update, counter_changes)
+
+            self.bulk_update(to_update, ['like', 'in_bookmarks', 'rate'])
+            if deferred_counters():
+                for book_id in counter_changes.keys() | recount:
+                    defer(recount_book, book_id)
+            else:
+                Book.objects.using(self.db).apply_counter_changes(
+                    {book_id: change for book_id, change in counter_changes.items() if book_id not in recount})
+                if recount:
+                    Book.objects.using(self.db).filter(pk__in=recount).rebuild_counters()
+        return [existing[book_id] for book_id in changes]
+
+    def _lock_relations(self, user, book_ids):
+        return {relation.book_id: relation
+                for relation in self.select_for_update().filter(user=user, book_id__in=book_ids)}
+
+    def _change_relation(self, relation, values, to_update, counter_changes):
+        if all(getattr(relation, field) == value for field, value in values.items()):
+            return
+        old_state = relation.counter_state()
+        for field, value in values.items():
+            setattr(relation, field, value)
+        relation._saved_state = relation.counter_state()
+        to_update.append(relation)
+        counter_changes[relation.book_id] = (relation_deltas(old_state, relation._saved_state), False)
+
+    def _insert_new(self, relations):
+        """
+        Insert `relations`, skipping the ones whose `(user, book)` row already exists. Sets
+        the pk of the inserted ones and returns their book ids, or `None` on databases
+        without `INSERT ... RETURNING`, which can't tell them apart.
+        """
+        if not relations:
+            return set()
+        connection = connections[self.db]
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.bulk_create(relations, ignore_conflicts=True)
+            return None
+
+        qn = connection.ops.quote_name
+        columns = ['user_id', 'book_id', *self.STATE_FIELDS]
+        fields = [self.model._meta.get_field(column) for column in columns]
+        batch_size = max(connection.ops.bulk_batch_size(fields, relations), 1)
+        by_book = {relation.book_id: relation for relation in relations}
+        inserted = set()
+        with connection.cursor() as cursor:
+            for start in range(0, len(relations), batch_size):
+                batch = relations[start:start + batch_size]
+                sql = 'INSERT INTO {table} ({columns}) VALUES {rows} ' \
+                      'ON CONFLICT ({user_id}, {book_id}) DO NOTHING RETURNING {id}, {book_id}'.format(
+                          table=qn(self.model._meta.db_table),
+                          columns=', '.join(qn(column) for column in columns),
+                          rows=', '.join(['({})'.format(', '.join(['%s'] * len(columns)))] * len(batch)),
+                          user_id=qn('user_id'),
+                          book_id=qn('book_id'),
+                          id=qn('id'),
+                      )
+                cursor.execute(sql, [getattr(relation, field.attname) for relation in batch for field in fields])
+                for pk, book_id in cursor.fetchall():
+                    relation = by_book[book_id]
+                    relation.pk = pk
+                    relation._state.adding = False
+                    relation._state.db = self.db
+                    inserted.add(book_id)
+        return inserted
+
+
 class UserBookRelation(models.Model):
     RATE_CHOICES = (
         (1, 'Bad'),
@@ -27,6 +328,73 @@ class UserBookRelation(models.Model):
     in_bookmarks = models.BooleanField(default=False)
     rate = models.PositiveSmallIntegerField(choices=RATE_CHOICES, null=True)
 
+    objects = UserBookRelationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], name='store_userbookrelation_user_book_uniq'),
+        ]
+        indexes = [
+            # A user's library pages, in relation order.
+            models.Index(fields=['user', 'id'], condition=Q(like=True), name='store_ubr_user_liked_idx'),
+            models.Index(fields=['user', 'id'], condition=Q(in_bookmarks=True), name='store_ubr_user_bookmarked_idx'),
+            models.Index(fields=['user', 'id'], condition=Q(rate__isnull=False), name='store_ubr_user_rated_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_state = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields() & {'like', 'in_bookmarks', 'rate'}:
+            instance._saved_state = instance.counter_state()
+        return instance
+
     def __str__(self):
         return f"{self.user.username}: {self.book}, RATE: {self.rate}"
 
+    def counter_state(self):
+        return relation_state(self.like, self.in_bookmarks, self.rate)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        deferred = deferred_counters()
+        with transaction.atomic():
+            if self._saved_state is None and self.pk is not None and not deferred:
+                self._saved_state = UserBookRelation.objects.filter(pk=self.pk)\
+                    .values_list('like', 'in_bookmarks', 'rate').first()
+                if self._saved_state is not None:
+                    self._saved_state = relation_state(*self._saved_state)
+            super().save(*args, **kwargs)
+            new_state = self.counter_state()
+            if deferred:
+                defer(recount_book, self.book_id)
+            else:
+                Book.objects.filter(pk=self.book_id).apply_counter_deltas(
+                    relation_deltas(self._saved_state, new_state), touch=adding)
+        self._saved_state = new_state
+
+
+class Task(models.Model):
+    """
+    A queued run of a `store.tasks` task, for `DatabaseTaskQueue`.
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    run_after = models.DateTimeField()
+    claimed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            # One pending run per key: repeats fold into it.
+            models.UniqueConstraint(fields=['name', 'key'], condition=Q(claimed_at__isnull=True),
+                                    name='store_task_pending_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['run_after'], name='store_task_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}({self.key})"
@@ -0,0 +1,179 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a single ordering field with the primary key as a tiebreaker.
+
+    The page is selected with `WHERE (field, id) > (value, last_id)` instead of OFFSET,
+    so every page costs the same index range scan no matter how deep the client is.
+    Cursors are opaque base64 tokens; clients only follow `next` / `previous` links.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_param = api_settings.ORDERING_PARAM
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.queryset = queryset
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            value, pk, reverse = None, None, False
+        else:
+            value, pk, reverse = cursor
+
+        # Walking backwards is the same seek with every comparison and sort flipped.
+        descending = self.descending != reverse
+        queryset = queryset.order_by(*self.get_order_by(descending))
+        if pk is not None:
+            queryset = queryset.filter(self.get_seek_filter(value, pk, descending))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = pk is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, pk is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return `(field, descending)` from the first `?ordering=` term allowed by the view.
+        Anything not listed in `view.ordering_fields` falls back to the tiebreaker.
+        `view.ordering_aliases` maps extra terms onto annotations, e.g. `relevance` onto
+        `-search_rank`; they only apply when the annotation is present.
+        """
+        allowed = set(getattr(view, 'ordering_fields', None) or ())
+        allowed.add(self.tiebreaker)
+        aliases = getattr(view, 'ordering_aliases', None) or {}
+
+        params = request.query_params.get(self.ordering_param, '')
+        for term in (t.strip() for t in params.split(',')):
+            name, descending = term.lstrip('-'), term.startswith('-')
+            if name in aliases and aliases[name].lstrip('-') in queryset.query.annotations:
+                return aliases[name].lstrip('-'), descending != aliases[name].startswith('-')
+            if name in allowed:
+                return name, descending
+        return self.tiebreaker, False
+
+    def get_order_by(self, descending):
+        prefix = '-' if descending else ''
+        if self.field == self.tiebreaker:
+            return [prefix + self.tiebreaker]
+        return [prefix + self.field, prefix + self.tiebreaker]
+
+    def get_seek_filter(self, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        if self.field == self.tiebreaker:
+            return Q(**{f'{self.tiebreaker}__{op}': pk})
+        return (
+            Q(**{f'{self.field}__{op}': value}) |
+            Q(**{self.field: value, f'{self.tiebreaker}__{op}': pk})
+        )
+
+    def get_position(self, obj, field):
+        if isinstance(obj, dict):
+            return obj[field]
+        return getattr(obj, field)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if data['f'] != self.field:
+                raise ValueError('Cursor does not match the requested ordering')
+            pk = int(data['id'])
+            value = data.get('v')
+            if self.field != self.tiebreaker:
+                value = self.to_python(value)
+            return value, pk, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, value):
+        annotation = self.queryset.query.annotations.get(self.field)
+        if annotation is not None:
+            return annotation.output_field.to_python(value)
+        try:
+            field = self.queryset.model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    @classmethod
+    def make_cursor(cls, field, pk, value=None, reverse=False):
+        data = {'f': field, 'id': pk, 'r': int(reverse)}
+        if field != cls.tiebreaker:
+            data['v'] = force_str(value)
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+    def encode_cursor(self, obj, reverse):
+        encoded = self.make_cursor(self.field, self.get_position(obj, self.tiebreaker),
+                                   self.get_position(obj, self.field), reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,30 @@
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class JSONLinesParser(BaseParser):
+    """
+    Parses a JSON Lines body lazily: `request.data` is a generator of
+    `(line_number, item, error)` tuples, so the body is never held in memory at once.
+    Blank lines are skipped; a line that isn't valid JSON yields an error instead of an item.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return self.iter_lines(stream, encoding)
+
+    def iter_lines(self, stream, encoding):
+        if stream is None:
+            return
+        for line_number, line in enumerate(stream, start=1):
+            try:
+                line = line.decode(encoding).strip()
+                if not line:
+                    continue
+                yield line_number, json.loads(line), None
+            except ValueError as exc:
+                yield line_number, None, f'JSON parse error - {exc}'
@@ -0,0 +1,112 @@
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from store.cache import get_catalogue_modified
+
+STICKY_KEY_PREFIX = 'store:primary-sticky'
+
+_read_alias = ContextVar('store_read_alias', default=None)
+
+
+def get_replica_alias():
+    return getattr(settings, 'STORE_READ_REPLICA', None)
+
+
+def get_replica_lag():
+    return getattr(settings, 'STORE_REPLICA_STICKY_SECONDS', 5)
+
+
+def mark_primary_sticky(user_id):
+    """
+    Keep `user_id` reading from the primary for `STORE_REPLICA_STICKY_SECONDS`, until the
+    replica has caught up with what it just wrote.
+    """
+    if get_replica_alias() and user_id is not None:
+        cache.set(f'{STICKY_KEY_PREFIX}:{user_id}', True, get_replica_lag())
+
+
+def replica_may_lag():
+    """
+    Whether the last catalogue write is recent enough for the replica to be missing it.
+    """
+    return time.time() - get_catalogue_modified().timestamp() < get_replica_lag()
+
+
+def is_primary_sticky(user_id):
+    return user_id is not None and cache.get(f'{STICKY_KEY_PREFIX}:{user_id}', False)
+
+
+def read_from(alias, iterator):
+    """
+    Iterate over `iterator`, reading from `alias` while each item is produced.
+    """
+    iterator = iter(iterator)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield item
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica while `ReplicaReadMixin` serves a safe request, everything else
+    to `default`: writes, tasks, management commands and reads in write requests.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        aliases = {'default', get_replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serves `GET` / `HEAD` from the `STORE_READ_REPLICA` database. A user who wrote through
+    any view with this mixin reads from the primary for a while afterwards.
+
+    Within `STORE_REPLICA_STICKY_SECONDS` of a catalogue write the replica may still serve
+    the old rows under the new catalogue version, so those responses are neither cached
+    (`CachedResponseMixin`) nor given validators to revalidate against.
+    """
+    _replica_may_lag = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        alias = get_replica_alias()
+        if alias and request.method in SAFE_METHODS and not is_primary_sticky(request.user.pk):
+            self._replica_token = _read_alias.set(alias)
+            self._replica_alias = alias
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+            if getattr(response, 'streaming', False):
+                # Its queries only run while the body is sent.
+                response.streaming_content = read_from(self._replica_alias, response.streaming_content)
+            self._replica_may_lag = replica_may_lag()
+            if self._replica_may_lag:
+                for header in ('ETag', 'Last-Modified'):
+                    if header in response:
+                        del response[header]
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            mark_primary_sticky(getattr(request.user, 'pk', None))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def is_response_cacheable(self, request, response):
+        return not self._replica_may_lag and super().is_response_cacheable(request, response)
@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+RANK_ANNOTATION = 'search_rank'
+
+_vendor_backends = {}
+
+
+class SimpleSearchBackend:
+    """
+    Plain matching, exactly what `SearchFilter` does: every term must match at least one of
+    the `lookups` (`icontains` on the view's `search_fields`). It has no index and no ranking.
+    """
+    lookups = ('name__icontains', 'author_name__icontains')
+
+    def term_q(self, term, lookups):
+        q = Q()
+        for lookup in lookups:
+            q |= Q(**{lookup: term})
+        return q
+
+    def filter(self, queryset, terms, lookups=None):
+        for term in terms:
+            queryset = queryset.filter(self.term_q(term, lookups or self.lookups))
+        return queryset
+
+    def rank(self, terms):
+        return Value(0.0, output_field=FloatField())
+
+    def search(self, queryset, terms, lookups=None, ranked=False):
+        queryset = self.filter(queryset, terms, lookups)
+        if ranked:
+            queryset = queryset.annotate(**{RANK_ANNOTATION: self.rank(terms)})
+        return queryset
+
+
+class SQLiteSearchBackend(SimpleSearchBackend):
+    """
+    FTS5 table over `store_book` with the trigram tokenizer, kept in sync by triggers
+    (see migration 0011). Trigrams index every substring of three or more characters, but
+    fold case beyond ASCII, which `LIKE` doesn't: the index only picks the candidate rows
+    and the lookups decide, so the results are the same as `icontains`.
+    """
+    table = 'store_book_fts'
+    indexed_lookups = {'name__icontains', 'author_name__icontains'}
+    min_term_length = 3
+
+    def match_query(self, terms):
+        phrases = ['"{}"'.format(term.replace('"', '""')) for term in terms if len(term) >= self.min_term_length]
+        return ' AND '.join(phrases)
+
+    def filter(self, queryset, terms, lookups=None):
+        match = self.match_query(terms)
+        if match and set(lookups or self.lookups) <= self.indexed_lookups:
+            queryset = queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+                                                     [match]))
+        return super().filter(queryset, terms, lookups)
+
+    def rank(self, terms):
+        match = self.match_query(terms)
+        if not match:
+            return super().rank(terms)
+        # bm25() is lower for better matches.
+        return RawSQL(f'SELECT -rank FROM {self.table} WHERE {self.table} MATCH %s AND rowid = store_book.id',
+                      [match], output_field=FloatField())
+
+
+class PostgresSearchBackend(SimpleSearchBackend):
+    """
+    `icontains` predicates served by pg_trgm GIN indexes, ranked by `ts_rank` over the
+    trigger-maintained `search_vector` tsvector column (see migration 0011).
+    """
+    config = 'simple'
+
+    def rank(self, terms):
+        return RawSQL('ts_rank(store_book.search_vector, plainto_tsquery(%s, %s))',
+                      [self.config, ' '.join(terms)], output_field=FloatField())
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(model):
+    """
+    Backend from the `STORE_SEARCH_BACKEND` setting, or picked for the database
+    `model` is read from.
+    """
+    path = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+
+    alias = router.db_for_read(model)
+    if alias not in _vendor_backends:
+        connection = connections[alias]
+        backend_class = VENDOR_BACKENDS.get(connection.vendor, SimpleSearchBackend)
+        if backend_class is SQLiteSearchBackend and SQLiteSearchBackend.table not in _table_names(connection):
+            # FTS5 or its trigram tokenizer is missing from this SQLite build.
+            backend_class = SimpleSearchBackend
+        _vendor_backends[alias] = backend_class()
+    return _vendor_backends[alias]
+
+
+def _table_names(connection):
+    with connection.cursor() as cursor:
+        return connection.introspection.table_names(cursor)
+
+
+class BookSearchFilter(SearchFilter):
+    """
+    `SearchFilter` with the same `?search=` semantics, delegated to an indexed backend.
+    `?ordering=relevance` sorts by the backend rank.
+    """
+    relevance_ordering = 'relevance'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not self.get_search_fields(view, request) or not terms:
+            return queryset
+
+        lookups = [self.construct_search(str(field), queryset) for field in self.get_search_fields(view, request)]
+        ordering = request.query_params.get('ordering', '')
+        ranked = self.relevance_ordering in (term.strip().lstrip('-') for term in ordering.split(','))
+        return get_search_backend(queryset.model).search(queryset, terms, lookups, ranked=ranked)
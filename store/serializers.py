@@ -2,6 +2,37 @@ from django.contrib.auth.models import User
 from rest_framework import serializers
 
 from store.models import Book, UserBookRelation
+from store.timing import TimedListSerializer, TimedSerializerMixin
+
+READERS_ALL = 'all'
+READERS_COUNT = 'count'
+READERS_TOP = 'top'
+READERS_NONE = 'none'
+
+
+def parse_readers_param(value, max_limit=100):
+    """
+    Parse `?readers=count|top:N|none` into `(mode, limit)`; no value means all readers.
+    """
+    if not value:
+        return READERS_ALL, None
+    if value in (READERS_COUNT, READERS_NONE):
+        return value, None
+
+    mode, _, limit = value.partition(':')
+    if mode == READERS_TOP and limit.isdigit() and 0 < int(limit) <= max_limit:
+        return READERS_TOP, int(limit)
+    raise serializers.ValidationError(
+        {'readers': [f'Expected "count", "none" or "top:N" with N from 1 to {max_limit}.']})
+
+
+def parse_fields_param(value):
+    """
+    Parse a comma-separated `?fields=` / `?exclude=` value; no value means no restriction.
+    """
+    if not value:
+        return None
+    return tuple(name.strip() for name in value.split(',') if name.strip())
 
 
 class BookReaderSerializer(serializers.ModelSerializer):
@@ -10,15 +41,72 @@ class BookReaderSerializer(serializers.ModelSerializer):
         fields = ('first_name', 'last_name')
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookReaderRelationSerializer(serializers.Serializer):
+    first_name = serializers.CharField(source='user.first_name', read_only=True)
+    last_name = serializers.CharField(source='user.last_name', read_only=True)
+
+
+class MyRelationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserBookRelation
+        fields = ('like', 'in_bookmarks', 'rate')
+
+
+class BookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # likes_count = serializers.SerializerMethodField()
-    annotated_likes = serializers.IntegerField(read_only=True)
+    annotated_likes = serializers.IntegerField(source='likes_count', read_only=True)
     owner_name = serializers.CharField(source='owner.username', default='', read_only=True)
     readers = BookReaderSerializer(many=True, read_only=True)
+    my_relation = serializers.SerializerMethodField()
+    # Only rendered when `?fields=` or `?include=` names them: they make the response differ per
+    # user, so it can't share cache entries and ETags with everyone else's.
+    opt_in_fields = ('my_relation',)
 
     class Meta:
         model = Book
-        fields = ('id', 'name', 'price', 'author_name', 'annotated_likes', 'owner_name', 'readers')
+        fields = ('id', 'name', 'price', 'author_name', 'annotated_likes', 'rating', 'rating_count',
+                  'owner_name', 'readers', 'my_relation')
+        read_only_fields = ('rating', 'rating_count')
+        list_serializer_class = TimedListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        mode, _ = self.context.get('readers', (READERS_ALL, None))
+        if mode == READERS_COUNT:
+            self.fields.pop('readers')
+            self.fields['readers_count'] = serializers.IntegerField(read_only=True)
+        elif mode == READERS_TOP:
+            self.fields['readers'] = BookReaderRelationSerializer(many=True, read_only=True,
+                                                                  source='top_reader_relations')
+        elif mode == READERS_NONE:
+            self.fields.pop('readers')
+
+        fields, exclude, include = self.context.get('fields', (None, None, None))
+        unknown = (set(fields or ()) | set(exclude or ()) | set(include or ())) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': [f'Unknown field "{name}".' for name in sorted(unknown)]})
+        include = set(include or ())
+        for name in list(self.fields):
+            if fields is None and name in self.opt_in_fields and name not in include:
+                self.fields.pop(name)
+            elif (fields is not None and name not in fields and name not in include) or (exclude and name in exclude):
+                self.fields.pop(name)
+
+        # Only a logged-in user has a relation to show.
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            self.fields.pop('my_relation', None)
+
+    def get_my_relation(self, instance):
+        """
+        Like / bookmark / rate of the requesting user, or `None`. Lists prefetch them per page
+        into `my_relations`.
+        """
+        relations = getattr(instance, 'my_relations', None)
+        if relations is None:
+            relations = instance.userbookrelation_set.filter(user=self.context['request'].user)
+        relation = next(iter(relations), None)
+        return None if relation is None else MyRelationSerializer(relation).data
 
     # def get_likes_count(self, instance):
     #     return UserBookRelation.objects.filter(book=instance, like=True).count()
@@ -28,3 +116,32 @@ class UserBookRelationSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserBookRelation
         exclude = ('user',)
+
+
+class LibraryBookSerializer(serializers.ModelSerializer):
+    annotated_likes = serializers.IntegerField(source='likes_count', read_only=True)
+
+    class Meta:
+        model = Book
+        fields = ('id', 'name', 'price', 'author_name', 'annotated_likes', 'rating', 'rating_count')
+
+
+class UserBookLibrarySerializer(serializers.ModelSerializer):
+    book = LibraryBookSerializer(read_only=True)
+
+    class Meta:
+        model = UserBookRelation
+        fields = ('id', 'book', 'like', 'in_bookmarks', 'rate')
+
+
+class UserBookRelationBatchSerializer(serializers.ModelSerializer):
+    book = serializers.IntegerField(source='book_id')
+
+    class Meta:
+        model = UserBookRelation
+        fields = ('book', 'like', 'in_bookmarks', 'rate')
+        extra_kwargs = {
+            'like': {'required': False},
+            'in_bookmarks': {'required': False},
+            'rate': {'required': False},
+        }
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.cache import invalidate_catalogue
+from store.counters import relation_deltas
+from store.models import Book, UserBookRelation, deferred_counters, recount_book
+from store.tasks import defer
+from store.timing import install_query_recorder
+
+USER_RENDERED_FIELDS = {'username', 'first_name', 'last_name'}
+
+connection_created.connect(install_query_recorder, dispatch_uid='store.timing')
+
+
+@receiver(post_delete, sender=UserBookRelation)
+def relation_deleted(sender, instance, **kwargs):
+    # Also fires for cascades (a deleted user) and queryset deletes, unlike Model.delete().
+    if deferred_counters():
+        defer(recount_book, instance.book_id)
+        return
+    Book.objects.filter(pk=instance.book_id).apply_counter_deltas(
+        relation_deltas(instance.counter_state(), None), touch=True)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=UserBookRelation)
+@receiver(post_delete, sender=UserBookRelation)
+def catalogue_changed(sender, **kwargs):
+    invalidate_catalogue()
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Book responses show the owner's username and the readers' names. Logins only save
+    # `last_login`, which no response shows.
+    if created or (update_fields is not None and not set(update_fields) & USER_RENDERED_FIELDS):
+        return
+    Book.objects.filter(Q(owner=instance) | Q(readers=instance)).update(updated_at=Now())
+    invalidate_catalogue()
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    # CONN_HEALTH_CHECKS is only built into Django 4.1+: drop persistent connections the
+    # server has closed before this request reuses them.
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS') and connection.connection is not None and
+                not connection.in_atomic_block and not connection.is_usable()):
+            connection.close()
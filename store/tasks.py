@@ -0,0 +1,196 @@
+import heapq
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def task(func):
+    """
+    Register `func(key)` as a task. Work for the same key is coalesced, so a task must
+    act on the current state of the key rather than on what changed.
+    """
+    _registry[func.__name__] = func
+    return func
+
+
+def defer(func, key):
+    """
+    Run `func(key)` in the background once the current transaction commits.
+    """
+    get_task_queue().defer(func.__name__, key)
+
+
+def run_task(name, key):
+    try:
+        _registry[name](key)
+    except Exception:
+        logger.exception('Task %s(%r) failed', name, key)
+        return False
+    return True
+
+
+class ImmediateTaskQueue:
+    """
+    Runs every task right after the commit, in the request. For development and tests.
+    """
+
+    def defer(self, name, key):
+        transaction.on_commit(lambda: self.enqueue(name, key))
+
+    def enqueue(self, name, key):
+        run_task(name, key)
+
+
+class ThreadPoolTaskQueue(ImmediateTaskQueue):
+    """
+    In-process queue. A task runs on a pool thread `delay` seconds after it was first
+    enqueued; enqueueing the same `(name, key)` again in the meantime does nothing, so a burst
+    of writes to one book costs one run. Pending tasks are lost if the process dies.
+    """
+
+    def __init__(self, workers=4, delay=1.0):
+        self.delay = delay
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='store-tasks')
+        self.condition = threading.Condition()
+        self.scheduled = []
+        self.pending = set()
+        self.running = 0
+        self.scheduler = None
+
+    def enqueue(self, name, key):
+        with self.condition:
+            if (name, key) in self.pending:
+                return
+            self.pending.add((name, key))
+            heapq.heappush(self.scheduled, (time.monotonic() + self.delay, name, key))
+            if self.scheduler is None:
+                self.scheduler = threading.Thread(target=self.schedule, name='store-tasks-scheduler', daemon=True)
+                self.scheduler.start()
+            self.condition.notify_all()
+
+    def schedule(self):
+        while True:
+            with self.condition:
+                while not self.scheduled or self.scheduled[0][0] > time.monotonic():
+                    self.condition.wait(self.scheduled[0][0] - time.monotonic() if self.scheduled else None)
+                _, name, key = heapq.heappop(self.scheduled)
+                # From here on a new write needs a new run: this one may already have read the row.
+                self.pending.discard((name, key))
+                self.running += 1
+            self.executor.submit(self.run, name, key)
+
+    def run(self, name, key):
+        close_old_connections()
+        try:
+            run_task(name, key)
+        finally:
+            close_old_connections()
+            with self.condition:
+                self.running -= 1
+                self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait until every enqueued task has run. Returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.running, timeout)
+
+
+class DatabaseTaskQueue:
+    """
+    Durable queue in the `store.Task` table, run by any number of `run_tasks` workers.
+
+    A task row is written in the same transaction as the change that needs it, so it is
+    never lost or run for a rolled-back write. At most one unclaimed row exists per
+    `(name, key)`; repeats within `delay` seconds fold into it. Claims of a worker that died
+    expire after `claim_timeout` seconds, failed tasks are retried after `retry_delay`.
+    """
+
+    def __init__(self, delay=1.0, claim_timeout=300, retry_delay=60):
+        self.delay = delay
+        self.claim_timeout = claim_timeout
+        self.retry_delay = retry_delay
+
+    @property
+    def model(self):
+        return apps.get_model('store', 'Task')
+
+    def defer(self, name, key):
+        self.enqueue(name, key)
+
+    def enqueue(self, name, key):
+        run_after = timezone.now() + timedelta(seconds=self.delay)
+        self.model.objects.bulk_create([self.model(name=name, key=json.dumps(key), run_after=run_after)],
+                                       ignore_conflicts=True)
+
+    def claimable(self, now):
+        return (Q(claimed_at__isnull=True, run_after__lte=now) |
+                Q(claimed_at__lt=now - timedelta(seconds=self.claim_timeout)))
+
+    def claim(self, limit):
+        now = timezone.now()
+        with transaction.atomic():
+            candidates = list(self.model.objects.select_for_update(skip_locked=True)
+                              .filter(self.claimable(now)).order_by('run_after').values_list('pk', flat=True)[:limit])
+        # Claiming is a conditional UPDATE, so two workers never take the same row.
+        claimed = [pk for pk in candidates
+                   if self.model.objects.filter(self.claimable(now), pk=pk).update(claimed_at=now)]
+        return list(self.model.objects.filter(pk__in=claimed).order_by('run_after'))
+
+    def run_pending(self, limit=100):
+        """
+        Claim and run up to `limit` due tasks. Returns the number run.
+        """
+        tasks = self.claim(limit)
+        for row in tasks:
+            if run_task(row.name, json.loads(row.key)):
+                row.delete()
+                continue
+            row.claimed_at = None
+            row.run_after = timezone.now() + timedelta(seconds=self.retry_delay)
+            try:
+                with transaction.atomic():
+                    row.save(update_fields=['claimed_at', 'run_after'])
+            except IntegrityError:
+                # The key was enqueued again while running; that row will retry it.
+                row.delete()
+        return len(tasks)
+
+
+def get_task_queue():
+    """
+    The queue configured by `STORE_TASK_QUEUE = {'BACKEND': ..., 'OPTIONS': {...}}`.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            config = getattr(settings, 'STORE_TASK_QUEUE', {})
+            backend = import_string(config.get('BACKEND', 'store.tasks.ThreadPoolTaskQueue'))
+            _queue = backend(**config.get('OPTIONS', {}))
+        return _queue
+
+
+@receiver(setting_changed)
+def reset_task_queue(setting, **kwargs):
+    global _queue
+    if setting == 'STORE_TASK_QUEUE':
+        _queue = None
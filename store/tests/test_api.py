@@ -1,12 +1,19 @@
 import json
-from django.db.models import Count, Case, When
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
 from rest_framework.test import APITestCase
+from store.cache import bump_catalogue_version
+from store.fast_serializers import BookListFastSerializer
 from store.models import Book, UserBookRelation
 from store.serializers import BookSerializer
+from store.views import BookViewSet
 
 
 class BooksApiTestCase(APITestCase):
@@ -20,29 +27,26 @@ class BooksApiTestCase(APITestCase):
     def test_get(self):
         url = reverse('book-list')
         response = self.client.get(url)
-        books = Book.objects.all().annotate(
-            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('id')
+        books = Book.objects.all().order_by('id')
         serializer_data = BookSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_filter(self):
         url = reverse('book-list')
-        books = Book.objects.filter(id__in=[self.book1.id, self.book3.id]).annotate(
-            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('id')
+        books = Book.objects.filter(id__in=[self.book1.id, self.book3.id]).order_by('id')
         response = self.client.get(url, data={'search': 'Author 1'})                    # тест для поиска
         serializer_data = BookSerializer(books, many=True).data      # в сериалайзер приходят только два объекта
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_ordering(self):
         url = reverse('book-list')
-        books = Book.objects.all().annotate(
-            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('id')
+        books = Book.objects.all().order_by('id')
         response = self.client.get(url, data={'ordering': 'price'})
         serializer_data = BookSerializer(books, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_create(self):
         self.assertEqual(Book.objects.count(), 3)
@@ -131,8 +135,10 @@ class BooksApiTestCase(APITestCase):
             'author_name': 'Author 1',
             # 'likes_count': 0,
             'annotated_likes': 0,
+            'rating': '0.00',
+            'rating_count': 0,
             'owner_name': self.user.username,
-            'readers': []
+            'readers': [],
         }
 
         response = self.client.get(url, content_type='application/json')
@@ -141,6 +147,321 @@ class BooksApiTestCase(APITestCase):
         self.assertEqual(data, response.data)
 
 
+class BooksPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(name=f'book_{i}', price=price, author_name=f'Author {i % 3}')
+            for i, price in enumerate([30, 10, 20, 10, 30, 20, 10])
+        ]
+
+    def walk(self, params):
+        url = reverse('book-list')
+        response = self.client.get(url, data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        pages = [response.data]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            pages.append(response.data)
+        return pages
+
+    def test_page_size(self):
+        pages = self.walk({'page_size': 3})
+        self.assertEqual([3, 3, 1], [len(page['results']) for page in pages])
+        self.assertIsNone(pages[0]['previous'])
+        ids = [book['id'] for page in pages for book in page['results']]
+        self.assertEqual([book.id for book in self.books], ids)
+
+    def test_max_page_size(self):
+        response = self.client.get(reverse('book-list'), data={'page_size': 1000})
+        self.assertEqual(7, len(response.data['results']))
+        self.assertIsNone(response.data['next'])
+
+    def test_ordering_with_tiebreaker(self):
+        pages = self.walk({'page_size': 2, 'ordering': '-price'})
+        ids = [book['id'] for page in pages for book in page['results']]
+        expected = sorted(self.books, key=lambda book: (-book.price, -book.id))
+        self.assertEqual([book.id for book in expected], ids)
+
+    def test_ordering_by_author(self):
+        pages = self.walk({'page_size': 3, 'ordering': 'author_name'})
+        ids = [book['id'] for page in pages for book in page['results']]
+        expected = sorted(self.books, key=lambda book: (book.author_name, book.id))
+        self.assertEqual([book.id for book in expected], ids)
+
+    def test_previous(self):
+        pages = self.walk({'page_size': 3, 'ordering': 'price'})
+        response = self.client.get(pages[1]['previous'])
+        self.assertEqual(pages[0]['results'], response.data['results'])
+        self.assertIsNone(response.data['previous'])
+        self.assertEqual(pages[0]['next'], response.data['next'])
+
+    def test_ordering_by_rating(self):
+        users = [User.objects.create(username=f'user_{i}') for i in range(3)]
+        for user, rates in zip(users, [(5, 1, 3), (4, 2, 3), (3, 3, 3)]):
+            for book, rate in zip(self.books, rates):
+                UserBookRelation.objects.create(user=user, book=book, rate=rate)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('book-list'), data={'ordering': '-rating', 'page_size': 2})
+        results = response.data['results']
+        self.assertEqual([self.books[0].id, self.books[2].id], [book['id'] for book in results])
+        self.assertEqual(['4.00', '3.00'], [book['rating'] for book in results])
+        self.assertEqual([3, 3], [book['rating_count'] for book in results])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([self.books[1].id, self.books[6].id], [book['id'] for book in response.data['results']])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('book-list'), data={'cursor': 'not-a-cursor'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class BooksFilterTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        self.book3 = Book.objects.create(name='test_book3', price=65, author_name='Author 3', owner=self.other)
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True)
+        UserBookRelation.objects.create(user=self.user, book=self.book2, in_bookmarks=True)
+        UserBookRelation.objects.create(user=self.other, book=self.book3, like=True, in_bookmarks=True)
+
+    def get_ids(self, params):
+        response = self.client.get(reverse('book-list'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book['id'] for book in response.data['results']]
+
+    def test_filters(self):
+        self.client.force_login(self.user)
+        cases = [
+            ({'price': 45}, [self.book2]),
+            ({'price_min': 30}, [self.book2, self.book3]),
+            ({'price_max': 45}, [self.book1, self.book2]),
+            ({'price_min': 30, 'price_max': 50}, [self.book2]),
+            ({'author_name__in': 'Author 1,Author 3'}, [self.book1, self.book3]),
+            ({'owner': self.other.id}, [self.book3]),
+            ({'liked_by_me': 'true'}, [self.book1]),
+            ({'liked_by_me': 'false'}, [self.book2, self.book3]),
+            ({'bookmarked_by_me': 'true'}, [self.book2]),
+            ({'bookmarked_by_me': 'true', 'price_min': 50}, []),
+        ]
+        for params, books in cases:
+            with self.subTest(params=params):
+                self.assertEqual([book.id for book in books], self.get_ids(params))
+
+    def test_invalid_value(self):
+        response = self.client.get(reverse('book-list'), data={'price_min': 'cheap'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_by_me_anonymous(self):
+        self.assertEqual([], self.get_ids({'liked_by_me': 'true'}))
+        self.assertEqual([self.book1.id, self.book2.id, self.book3.id], self.get_ids({'liked_by_me': 'false'}))
+
+    def test_by_me_cached_per_user(self):
+        self.client.force_login(self.user)
+        self.assertEqual([self.book1.id], self.get_ids({'liked_by_me': 'true'}))
+        self.client.force_login(self.other)
+        self.assertEqual([self.book3.id], self.get_ids({'liked_by_me': 'true'}))
+
+    def test_single_query(self):
+        params = {'price_min': 10, 'price_max': 100, 'author_name__in': 'Author 1,Author 2', 'readers': 'none',
+                  'owner': self.user.id}
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual([self.book1.id], self.get_ids(params))
+        self.assertEqual(1, len(context.captured_queries))
+
+
+class BooksBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=self.user)
+
+    def test_bulk_import(self):
+        url = reverse('book-bulk')
+        lines = [
+            json.dumps({'name': 'Python 3', 'price': '900.00', 'author_name': "O'Reilly"}),
+            '',
+            json.dumps({'name': 'No price', 'author_name': 'Nobody'}),
+            '{not json',
+            json.dumps({'name': 'Django', 'price': 10, 'author_name': 'DSF'}),
+        ]
+        self.client.force_login(self.user)
+        response = self.client.post(url, data='\n'.join(lines), content_type='application/x-ndjson')
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, response.data)
+        self.assertEqual(2, response.data['created'])
+        self.assertEqual([3, 4], [error['line'] for error in response.data['errors']])
+        self.assertIn('price', response.data['errors'][0]['errors'])
+        imported = Book.objects.filter(owner=self.user).exclude(pk=self.book1.pk).order_by('id')
+        self.assertEqual(['Python 3', 'Django'], list(imported.values_list('name', flat=True)))
+
+    def test_bulk_import_batches(self):
+        url = reverse('book-bulk')
+        lines = '\n'.join(json.dumps({'name': f'book_{i}', 'price': i, 'author_name': 'Author'}) for i in range(25))
+        self.client.force_login(self.user)
+        with patch.object(BookViewSet, 'bulk_batch_size', 10):
+            response = self.client.post(url, data=lines, content_type='application/x-ndjson')
+        self.assertEqual(25, response.data['created'])
+        self.assertEqual(26, Book.objects.count())
+
+    def test_bulk_import_anonymous(self):
+        url = reverse('book-bulk')
+        data = json.dumps({'name': 'Python 3', 'price': 900, 'author_name': "O'Reilly"})
+        response = self.client.post(url, data=data, content_type='application/x-ndjson')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_export(self):
+        Book.objects.create(name='test_book2', price=45, author_name='Author 5')
+        response = self.client.get(reverse('book-export'))
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([
+            {'id': self.book1.id, 'name': 'test_book1', 'price': '25.00', 'author_name': 'Author 1',
+             'owner': self.user.id},
+            {'id': self.book1.id + 1, 'name': 'test_book2', 'price': '45.00', 'author_name': 'Author 5',
+             'owner': None},
+        ], rows)
+
+    def test_export_search(self):
+        response = self.client.get(reverse('book-export'), data={'search': 'nothing'})
+        self.assertEqual(b'', b''.join(response.streaming_content))
+
+
+class BooksReadersTestCase(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'user_{i}', first_name=f'First {i}', last_name=f'Last {i}')
+                      for i in range(4)]
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        self.book3 = Book.objects.create(name='test_book3', price=65, author_name='Author 3')
+        for user in self.users:
+            UserBookRelation.objects.create(user=user, book=self.book1)
+        UserBookRelation.objects.create(user=self.users[3], book=self.book2)
+
+    def get_results(self, **params):
+        response = self.client.get(reverse('book-list'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        return response.data['results']
+
+    def test_all(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.get_results()
+        self.assertEqual(4, len(results[0]['readers']))
+        self.assertEqual([{'first_name': 'First 3', 'last_name': 'Last 3'}], results[1]['readers'])
+        self.assertIn('first_name', queries.captured_queries[-1]['sql'])
+        for query in queries.captured_queries:
+            self.assertNotIn('password', query['sql'])
+
+    def test_count(self):
+        with self.assertNumQueries(1):
+            results = self.get_results(readers='count')
+        self.assertEqual([4, 1, 0], [book['readers_count'] for book in results])
+        self.assertNotIn('readers', results[0])
+
+    def test_top(self):
+        with self.assertNumQueries(2):
+            results = self.get_results(readers='top:2')
+        self.assertEqual([
+            [{'first_name': 'First 0', 'last_name': 'Last 0'}, {'first_name': 'First 1', 'last_name': 'Last 1'}],
+            [{'first_name': 'First 3', 'last_name': 'Last 3'}],
+            [],
+        ], [book['readers'] for book in results])
+
+    def test_top_per_book_limit(self):
+        # One LIMIT subquery per book on the page, not a correlated one per relation row.
+        for fast in (BookListFastSerializer, None):
+            with self.subTest(fast=fast), patch.object(BookViewSet, 'fast_list_serializer_class', fast):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    results = self.get_results(readers='top:2')
+                self.assertEqual([2, 1, 0], [len(book['readers']) for book in results])
+                sql = queries.captured_queries[-1]['sql']
+                self.assertEqual(3, sql.count('LIMIT 2'))
+                self.assertEqual(2, sql.count('UNION ALL'))
+
+    def test_top_detail(self):
+        response = self.client.get(reverse('book-detail', args=(self.book1.id,)), data={'readers': 'top:3'})
+        self.assertEqual(['First 0', 'First 1', 'First 2'],
+                         [reader['first_name'] for reader in response.data['readers']])
+
+    def test_none(self):
+        with self.assertNumQueries(1):
+            results = self.get_results(readers='none')
+        self.assertNotIn('readers', results[0])
+
+    def test_detail(self):
+        response = self.client.get(reverse('book-detail', args=(self.book1.id,)), data={'readers': 'count'})
+        self.assertEqual(4, response.data['readers_count'])
+
+    def test_invalid(self):
+        for value in ['top', 'top:0', 'top:1000', 'some']:
+            response = self.client.get(reverse('book-list'), data={'readers': value})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, value)
+
+
+class BooksFieldsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_username', first_name='Ivan', last_name='Petrov')
+        self.books = [Book.objects.create(name=f'test_book{i}', price=price, author_name=f'Author {i}', owner=self.user)
+                      for i, price in enumerate([45, 25, 65])]
+        for book in self.books:
+            UserBookRelation.objects.create(user=self.user, book=book, like=True)
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('book-list'), data={'fields': 'id,name,price'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'id': self.books[0].id, 'name': 'test_book0', 'price': '45.00'}, response.data['results'][0])
+        self.assertEqual(1, len(queries.captured_queries))
+        self.assertNotIn('auth_user', queries.captured_queries[0]['sql'])
+        self.assertNotIn('author_name', queries.captured_queries[0]['sql'])
+
+    def test_exclude(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('book-list'), data={'exclude': 'readers,owner_name'})
+        self.assertEqual(['id', 'name', 'price', 'author_name', 'annotated_likes', 'rating', 'rating_count'],
+                         list(response.data['results'][0]))
+
+    def test_ordering_by_pruned_field(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'fields': 'name', 'ordering': 'price', 'page_size': 2})
+        self.assertEqual([{'name': 'test_book1'}, {'name': 'test_book0'}], response.data['results'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([{'name': 'test_book2'}], response.data['results'])
+
+    def test_regular_serializer(self):
+        params = {'fields': 'id,owner_name,readers', 'ordering': '-price'}
+        with CaptureQueriesContext(connection) as queries:
+            with patch.object(BookViewSet, 'fast_list_serializer_class', None):
+                response = self.client.get(reverse('book-list'), data=params)
+        self.assertEqual({'id': self.books[2].id, 'owner_name': 'test_username',
+                          'readers': [{'first_name': 'Ivan', 'last_name': 'Petrov'}]}, response.data['results'][0])
+        self.assertEqual(2, len(queries.captured_queries))
+        self.assertNotIn('password', queries.captured_queries[0]['sql'])
+        self.assertNotIn('author_name', queries.captured_queries[0]['sql'])
+
+    def test_detail(self):
+        url = reverse('book-detail', args=(self.books[0].id,))
+        response = self.client.get(url, data={'fields': 'name,annotated_likes', 'readers': 'count'})
+        self.assertEqual({'name': 'test_book0', 'annotated_likes': 1}, response.data)
+
+    def test_unknown_field(self):
+        for params in ({'fields': 'id,password'}, {'exclude': 'owner'}, {'fields': 'readers_count'}):
+            response = self.client.get(reverse('book-list'), data=params)
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, params)
+
+    def test_writes_return_every_field(self):
+        self.client.force_login(self.user)
+        url = reverse('book-detail', args=(self.books[0].id,))
+        response = self.client.patch(url + '?fields=id', data={'price': 50}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('readers', response.data)
+
+
 class BooksRelationTestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create(username='test_username')
@@ -165,6 +486,17 @@ class BooksRelationTestCase(APITestCase):
 
         relation = UserBookRelation.objects.get(user=self.user, book=self.book1)
         self.assertTrue(relation.like)
+        self.assertEqual(1, self.book1.likes_count)
+
+        data = {
+            "like": False,
+        }
+
+        json_data = json.dumps(data)
+        response = self.client.patch(url, data=json_data, content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.book1.refresh_from_db()
+        self.assertEqual(0, self.book1.likes_count)
 
     def test_rate(self):
         url = reverse('userbookrelation-detail', args=(self.book1.id,))
@@ -182,6 +514,23 @@ class BooksRelationTestCase(APITestCase):
         relation = UserBookRelation.objects.get(user=self.user, book=self.book1)
         self.assertEqual(1, relation.rate)
 
+    def test_patch_twice(self):
+        url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.force_login(self.user)
+        self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        response = self.client.patch(url, data=json.dumps({'rate': 5}), content_type='application/json')
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(self.book1.id, response.data['book'])
+        self.assertEqual((True, 5), (response.data['like'], response.data['rate']))
+        self.assertEqual(1, UserBookRelation.objects.filter(user=self.user, book=self.book1).count())
+
+    def test_patch_unknown_book(self):
+        url = reverse('userbookrelation-detail', args=(self.book3.id + 100,))
+        self.client.force_login(self.user)
+        response = self.client.patch(url, data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
     def test_rate_wrong(self):
         url = reverse('userbookrelation-detail', args=(self.book1.id,))
 
@@ -193,3 +542,321 @@ class BooksRelationTestCase(APITestCase):
         self.client.force_login(self.user)
         response = self.client.patch(url, data=json_data, content_type='application/json')
         self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code, response.data)
+
+    def test_batch(self):
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True, rate=2)
+        UserBookRelation.objects.create(user=self.user2, book=self.book2, like=True)
+        url = reverse('userbookrelation-batch')
+        data = [
+            {'book': self.book1.id, 'like': False, 'rate': 5},
+            {'book': self.book2.id, 'like': True, 'in_bookmarks': True},
+            {'book': self.book3.id, 'rate': 4},
+            {'book': self.book3.id, 'like': True},
+        ]
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code, response.data)
+        self.assertEqual([
+            {'book': self.book1.id, 'like': False, 'in_bookmarks': False, 'rate': 5},
+            {'book': self.book2.id, 'like': True, 'in_bookmarks': True, 'rate': None},
+            {'book': self.book3.id, 'like': True, 'in_bookmarks': False, 'rate': 4},
+        ], response.data)
+
+        relations = UserBookRelation.objects.filter(user=self.user)
+        self.assertEqual(3, relations.count())
+        self.assertEqual((True, 4), relations.values_list('like', 'rate').get(book=self.book3))
+
+        for book, counters in [(self.book1, (0, 0, 5, 1)), (self.book2, (2, 1, 0, 0)), (self.book3, (1, 0, 4, 1))]:
+            book.refresh_from_db()
+            self.assertEqual(counters, (book.likes_count, book.bookmarks_count, book.rating_sum, book.rating_count))
+
+    def test_batch_query_count(self):
+        Book.objects.bulk_create(Book(name=f'book_{i}', price=i, author_name='Author') for i in range(50))
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        data = [{'book': book_id, 'like': True} for book_id in book_ids]
+        url = reverse('userbookrelation-batch')
+
+        self.client.force_login(self.user)
+        with self.assertNumQueries(8):
+            response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(len(book_ids), Book.objects.filter(likes_count=1).count())
+
+    def test_batch_unknown_book(self):
+        url = reverse('userbookrelation-batch')
+        data = [{'book': self.book1.id, 'like': True}, {'book': self.book3.id + 100, 'like': True}]
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_batch_invalid_rate(self):
+        url = reverse('userbookrelation-batch')
+        data = [{'book': self.book1.id, 'rate': 6}]
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class BooksTopTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        self.book3 = Book.objects.create(name='test_book3', price=65, author_name='Author 3')
+        for user in self.users:
+            UserBookRelation.objects.create(user=user, book=self.book2, like=True, rate=3)
+        for user in self.users[:2]:
+            UserBookRelation.objects.create(user=user, book=self.book1, like=True, rate=5, in_bookmarks=True)
+
+    def get_ids(self, params):
+        response = self.client.get(reverse('book-top'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book['id'] for book in response.data['results']]
+
+    def test_top(self):
+        cases = [
+            ({}, [self.book2, self.book1]),
+            ({'by': 'likes', 'limit': 1}, [self.book2]),
+            ({'by': 'rating'}, [self.book1, self.book2]),
+            ({'by': 'bookmarks'}, [self.book1]),
+        ]
+        for params, books in cases:
+            with self.subTest(params=params):
+                self.assertEqual([book.id for book in books], self.get_ids(params))
+
+    def test_matches_list(self):
+        response = self.client.get(reverse('book-top'), data={'by': 'rating'})
+        listed = self.client.get(reverse('book-list'), data={'ordering': '-rating'})
+        self.assertEqual(listed.data['results'][:2], response.data['results'])
+
+    def test_invalid_params(self):
+        for params in ({'by': 'price'}, {'limit': 0}, {'limit': 101}, {'limit': 'ten'}, {'limit': '²'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('book-top'), data=params)
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_updated_by_relations(self):
+        self.assertEqual([self.book2.id, self.book1.id], self.get_ids({}))
+        UserBookRelation.objects.create(user=self.users[2], book=self.book1, like=True)
+        for relation in UserBookRelation.objects.filter(book=self.book2, user__in=self.users[:2]):
+            relation.like = False
+            relation.save()
+        bump_catalogue_version()
+        self.assertEqual([self.book1.id, self.book2.id], self.get_ids({}))
+
+    def test_single_ranking_query(self):
+        self.get_ids({'readers': 'none'})
+        with CaptureQueriesContext(connection) as context:
+            self.get_ids({'readers': 'none', 'limit': 1})
+        self.assertEqual(1, len(context.captured_queries))
+
+
+class BooksLibraryTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other')
+        self.books = [Book.objects.create(name=f'test_book{i}', price=25, author_name=f'Author {i}') for i in range(5)]
+        for book in self.books[:3]:
+            UserBookRelation.objects.create(user=self.user, book=book, like=True)
+        UserBookRelation.objects.create(user=self.user, book=self.books[3], in_bookmarks=True, rate=4)
+        UserBookRelation.objects.create(user=self.other, book=self.books[4], like=True, rate=2)
+        self.client.force_login(self.user)
+
+    def get_library(self, params):
+        response = self.client.get(reverse('userbookrelation-mine'), data=params)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_kinds(self):
+        cases = [
+            ({}, self.books[:3]),
+            ({'kind': 'liked'}, self.books[:3]),
+            ({'kind': 'bookmarked'}, self.books[3:4]),
+            ({'kind': 'rated'}, self.books[3:4]),
+        ]
+        for params, books in cases:
+            with self.subTest(params=params):
+                data = self.get_library(params)
+                self.assertEqual([book.id for book in books], [item['book']['id'] for item in data['results']])
+
+    def test_item(self):
+        item = self.get_library({'kind': 'rated'})['results'][0]
+        self.assertEqual((False, True, 4), (item['like'], item['in_bookmarks'], item['rate']))
+        self.assertEqual('test_book3', item['book']['name'])
+
+    def test_pagination(self):
+        ids = []
+        data = self.get_library({'page_size': 2})
+        with CaptureQueriesContext(connection) as context:
+            while True:
+                ids.extend(item['book']['id'] for item in data['results'])
+                if data['next'] is None:
+                    break
+                data = self.client.get(data['next']).data
+        self.assertEqual([book.id for book in self.books[:3]], ids)
+        # The second page is a single query with the book joined in; the rest is the session.
+        self.assertEqual(1, len([query for query in context.captured_queries if 'store_book' in query['sql']]))
+
+    def test_invalid_kind(self):
+        response = self.client.get(reverse('userbookrelation-mine'), data={'kind': 'read'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_anonymous(self):
+        self.client.logout()
+        response = self.client.get(reverse('userbookrelation-mine'))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+
+class BooksMyRelationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.other = User.objects.create(username='other')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True, rate=5)
+        UserBookRelation.objects.create(user=self.other, book=self.book2, in_bookmarks=True)
+
+    def get_relations(self, url, params=None):
+        response = self.client.get(url, data={'fields': 'id,my_relation', **(params or {})})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book.get('my_relation', 'missing') for book in response.data['results']]
+
+    def test_list(self):
+        self.client.force_login(self.user)
+        expected = [{'like': True, 'in_bookmarks': False, 'rate': 5}, None]
+        self.assertEqual(expected, self.get_relations(reverse('book-list')))
+        self.assertEqual(expected[:1], self.get_relations(reverse('book-top')))
+
+    def test_anonymous(self):
+        self.assertEqual(['missing', 'missing'], self.get_relations(reverse('book-list')))
+
+    def test_opt_in(self):
+        self.client.force_login(self.user)
+        self.assertEqual(['missing', 'missing'], self.get_relations(reverse('book-list'), {'fields': 'id'}))
+        response = self.client.get(reverse('book-detail', args=(self.book1.id,)))
+        self.assertNotIn('my_relation', response.data)
+
+    def test_include(self):
+        self.client.force_login(self.user)
+        default = self.client.get(reverse('book-list')).data['results'][0]
+        for fast in (BookListFastSerializer, None):
+            with self.subTest(fast=fast), patch.object(BookViewSet, 'fast_list_serializer_class', fast):
+                cache.clear()
+                response = self.client.get(reverse('book-list'), data={'include': 'my_relation'})
+                book = response.data['results'][0]
+                self.assertEqual([*default, 'my_relation'], list(book))
+                self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': 5}, book['my_relation'])
+
+        response = self.client.get(reverse('book-detail', args=(self.book1.id,)), data={'include': 'my_relation'})
+        self.assertEqual(5, response.data['my_relation']['rate'])
+        self.assertIn('readers', response.data)
+        self.assertEqual([{'like': True, 'in_bookmarks': False, 'rate': 5}, None],
+                         self.get_relations(reverse('book-list'), {'fields': 'id', 'include': 'my_relation'}))
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('book-list'), data={'include': 'my_relation'})
+        self.assertEqual([None, {'like': False, 'in_bookmarks': True, 'rate': None}],
+                         [book['my_relation'] for book in response.data['results']])
+
+    def test_include_unknown(self):
+        response = self.client.get(reverse('book-list'), data={'include': 'secret'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_one_query_per_page(self):
+        self.client.force_login(self.user)
+        params = {'readers': 'none'}
+        with CaptureQueriesContext(connection) as context:
+            self.get_relations(reverse('book-list'), params)
+        self.assertEqual(1, len([query for query in context.captured_queries
+                                 if 'store_userbookrelation' in query['sql']]))
+
+    def test_cached_per_user(self):
+        self.client.force_login(self.user)
+        self.assertEqual([{'like': True, 'in_bookmarks': False, 'rate': 5}, None],
+                         self.get_relations(reverse('book-list')))
+        self.client.force_login(self.other)
+        self.assertEqual([None, {'like': False, 'in_bookmarks': True, 'rate': None}],
+                         self.get_relations(reverse('book-list')))
+
+    def test_detail_etag_per_user(self):
+        url = reverse('book-detail', args=(self.book2.id,)) + '?fields=id,my_relation'
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertIsNone(response.data['my_relation'])
+
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book2.id,)), data={'like': True}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': None}, response.data['my_relation'])
+
+        self.client.force_login(self.other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'like': False, 'in_bookmarks': True, 'rate': None}, response.data['my_relation'])
+
+
+class BooksCountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 5')
+        self.book3 = Book.objects.create(name='other', price=65, author_name='Author 1')
+        UserBookRelation.objects.create(user=self.user, book=self.book2, like=True)
+
+    def get_count(self, params):
+        response = self.client.get(reverse('book-list'), data={'count_only': 1, **params})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        data = json.loads(response.content)
+        self.assertEqual(str(data['count']), response['X-Total-Count'])
+        return data
+
+    def test_count(self):
+        self.client.force_login(self.user)
+        cases = [
+            ({}, 3),
+            ({'price_min': 30}, 2),
+            ({'search': 'test_book'}, 2),
+            ({'search': 'Author 1', 'price_max': 30}, 1),
+            ({'liked_by_me': 'true'}, 1),
+            ({'search': 'test', 'ordering': 'relevance'}, 2),
+        ]
+        for params, count in cases:
+            with self.subTest(params=params):
+                self.assertEqual({'count': count, 'exact': True}, self.get_count(params))
+
+    def test_single_count_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self.get_count({'price_min': 30, 'ordering': '-price'})
+        self.assertEqual(1, len(context.captured_queries))
+        sql = context.captured_queries[0]['sql']
+        self.assertIn('COUNT(*)', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('ORDER BY', sql)
+
+    def test_head(self):
+        for _ in range(2):
+            response = self.client.head(reverse('book-list'), data={'price_min': 30})
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(('2', 'true'), (response['X-Total-Count'], response['X-Total-Count-Exact']))
+            self.assertEqual(b'', response.content)
+        # The cached HEAD response doesn't stand in for the list.
+        response = self.client.get(reverse('book-list'), data={'price_min': 30})
+        self.assertEqual(2, len(response.data['results']))
+
+    def test_estimate(self):
+        with patch('store.counts.estimate_count', return_value=120000):
+            self.assertEqual({'count': 120000, 'exact': False}, self.get_count({'count_only': 'estimate'}))
+            self.assertEqual({'count': 2, 'exact': True},
+                             self.get_count({'count_only': 'estimate', 'price_min': 30}))
+        # Estimates of small tables are too rough to be worth it.
+        cache.clear()
+        with patch('store.counts.estimate_count', return_value=50):
+            self.assertEqual({'count': 3, 'exact': True}, self.get_count({'count_only': 'estimate'}))
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, TransactionTestCase
+from django.urls import reverse
+
+from store.models import Book, UserBookRelation
+from store.views import BookViewSet
+
+
+class AsyncBookViewsTestCase(TransactionTestCase):
+    # The async views query from worker threads, which can't see a test transaction.
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user', first_name='Ivan', last_name='Petrov')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        UserBookRelation.objects.create(user=self.user, book=self.book1, like=True)
+
+    async def get_json(self, url, client=None):
+        response = await (client or AsyncClient()).get(url)
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.content)
+
+    async def test_list(self):
+        sync_data = await self.get_json(reverse('book-list') + '?ordering=-price')
+        async_data = await self.get_json(reverse('book-async-list') + '?ordering=-price')
+        self.assertEqual(sync_data['results'], async_data['results'])
+        self.assertEqual([self.book2.id, self.book1.id], [book['id'] for book in async_data['results']])
+
+    async def test_detail(self):
+        sync_data = await self.get_json(reverse('book-detail', args=(self.book1.id,)))
+        self.assertEqual(sync_data, await self.get_json(reverse('book-async-detail', args=(self.book1.id,))))
+
+    async def test_relation_update(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.patch(reverse('userbookrelation-async-detail', args=(self.book2.id,)),
+                                      data=json.dumps({'like': True, 'rate': 4}), content_type='application/json')
+        self.assertEqual(200, response.status_code)
+        book = await sync_to_async(Book.objects.get)(pk=self.book2.id)
+        self.assertEqual((1, 4, 1), (book.likes_count, book.rating_sum, book.rating_count))
+
+    async def test_relation_update_anonymous(self):
+        response = await AsyncClient().patch(reverse('userbookrelation-async-detail', args=(self.book2.id,)),
+                                             data=json.dumps({'like': True}), content_type='application/json')
+        self.assertEqual(403, response.status_code)
+
+    async def test_concurrent(self):
+        # Requests that wait on the database overlap instead of queueing behind each other:
+        # the barrier only opens once all five are inside the view at the same time.
+        get_queryset = BookViewSet.get_queryset
+        barrier = threading.Barrier(5, timeout=5)
+
+        def overlapping_get_queryset(view):
+            if not getattr(view, 'passed_barrier', False):
+                view.passed_barrier = True
+                barrier.wait()
+            return get_queryset(view)
+
+        client = AsyncClient()
+        urls = [reverse('book-async-list') + f'?page_size={size}' for size in range(1, 6)]
+        with mock.patch.object(BookViewSet, 'get_queryset', overlapping_get_queryset):
+            responses = await asyncio.gather(*(client.get(url) for url in urls))
+        self.assertEqual([200] * 5, [response.status_code for response in responses])
+        self.assertFalse(barrier.broken)
@@ -0,0 +1,177 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.cache import get_cache_stats, get_catalogue_version
+from store.models import Book
+
+
+class BooksCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 5')
+
+    def test_list_hit(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'ordering': 'price', 'search': 'test'})
+        self.assertEqual('MISS', response['X-Cache'])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, data={'search': 'test', 'ordering': 'price'})
+        self.assertEqual(status.HTTP_200_OK, cached.status_code)
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(response.content, cached.content)
+        self.assertEqual({'hits': 1, 'misses': 1}, get_cache_stats())
+
+    def test_params_are_part_of_key(self):
+        url = reverse('book-list')
+        self.client.get(url, data={'ordering': 'price'})
+        response = self.client.get(url, data={'ordering': '-price'})
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(self.book2.id, response.data['results'][0]['id'])
+
+    def test_retrieve_hit(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        self.assertEqual('MISS', self.client.get(url)['X-Cache'])
+        self.assertEqual('HIT', self.client.get(url)['X-Cache'])
+        self.assertEqual('MISS', self.client.get(reverse('book-detail', args=(self.book2.id,)))['X-Cache'])
+
+    def test_not_found_is_not_cached(self):
+        url = reverse('book-detail', args=(self.book2.id + 100,))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(url).status_code)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(url).status_code)
+        self.assertEqual(0, get_cache_stats()['hits'])
+
+    def test_book_write_invalidates(self):
+        url = reverse('book-list')
+        self.client.get(url)
+        version = get_catalogue_version()
+
+        self.client.force_login(self.user)
+        data = json.dumps({'name': 'Python 3', 'price': 900, 'author_name': "O'Reilly"})
+        self.client.post(url, data=data, content_type='application/json')
+        self.assertNotEqual(version, get_catalogue_version())
+
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(3, len(response.data['results']))
+
+    def test_relation_write_invalidates(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        self.client.get(url)
+
+        self.client.force_login(self.user)
+        relation_url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.patch(relation_url, data=json.dumps({'like': True}), content_type='application/json')
+
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual(1, response.data['annotated_likes'])
+
+    def test_user_rename_invalidates(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        self.client.get(url)
+        self.user.username = 'renamed'
+        self.user.save()
+
+        response = self.client.get(url)
+        self.assertEqual('MISS', response['X-Cache'])
+        self.assertEqual('renamed', response.data['owner_name'])
+
+
+class BooksConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_username')
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=self.user)
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 5')
+
+    def test_list_not_modified(self):
+        url = reverse('book-list')
+        response = self.client.get(url, data={'ordering': 'price'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, data={'ordering': 'price'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(b'', response.content)
+
+    def test_list_etag_depends_on_params(self):
+        url = reverse('book-list')
+        etag = self.client.get(url, data={'ordering': 'price'})['ETag']
+        response = self.client.get(url, data={'ordering': '-price'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_list_modified_by_write(self):
+        url = reverse('book-list')
+        etag = self.client.get(url)['ETag']
+        Book.objects.create(name='test_book3', price=65, author_name='Author 2')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_detail_not_modified(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        response = self.client.get(url)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, not_modified.status_code)
+
+        not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, not_modified.status_code)
+
+    def test_detail_etag_per_query(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        etag = self.client.get(url)['ETag']
+        for query in ('?fields=id', '?readers=count'):
+            response = self.client.get(url + query, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotEqual(etag, response['ETag'])
+            not_modified = self.client.get(url + query, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(status.HTTP_304_NOT_MODIFIED, not_modified.status_code)
+
+    def test_detail_modified_by_relation(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        etag = self.client.get(url)['ETag']
+
+        self.client.force_login(self.user)
+        relation_url = reverse('userbookrelation-detail', args=(self.book1.id,))
+        self.client.patch(relation_url, data=json.dumps({'rate': 4}), content_type='application/json')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('4.00', response.data['rating'])
+
+        other_url = reverse('book-detail', args=(self.book2.id,))
+        other_etag = self.client.get(other_url)['ETag']
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED,
+                         self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag).status_code)
+
+    def test_detail_not_found(self):
+        url = reverse('book-detail', args=(self.book2.id + 100,))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_user_rename(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        response = self.client.get(url)
+
+        self.user.username = 'renamed'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('renamed', response.data['owner_name'])
+
+    def test_login_keeps_etag(self):
+        url = reverse('book-detail', args=(self.book1.id,))
+        etag = self.client.get(url)['ETag']
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
@@ -0,0 +1,83 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from store.fast_serializers import BookListFastSerializer, decimal_formatter
+from store.models import Book, UserBookRelation
+from store.serializers import BookSerializer, READERS_ALL, READERS_COUNT, READERS_NONE, READERS_TOP
+from store.views import BookViewSet
+
+
+class BookListFastSerializerTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(username='owner')
+        self.users = [User.objects.create(username=f'user{i}', first_name=f'Имя {i}', last_name=f'"Last" {i}')
+                      for i in range(4)]
+        self.books = [
+            Book.objects.create(name='Book 1', price=25, author_name='Author 1', owner=self.owner),
+            Book.objects.create(name='Книга 2', price=Decimal('0.5'), author_name='Author 2'),
+            Book.objects.create(name='Book 3', price=Decimal('99999.99'), author_name='Author "3"',
+                                owner=self.owner),
+        ]
+        for user in reversed(self.users):
+            UserBookRelation.objects.create(user=user, book=self.books[0], like=True, rate=user.id % 5 + 1)
+        UserBookRelation.objects.create(user=self.users[1], book=self.books[2], in_bookmarks=True, rate=2)
+
+    def get_view(self, mode, limit):
+        view = BookViewSet(request=Request(APIRequestFactory().get('/')), format_kwarg=None, kwargs={})
+        view._readers_mode = (mode, limit)
+        return view
+
+    def render_slow(self, mode, limit=None):
+        view = self.get_view(mode, limit)
+        books = list(view.get_queryset())
+        view.attach_top_readers(books)
+        data = BookSerializer(books, many=True, context={'readers': (mode, limit)}).data
+        return JSONRenderer().render(data)
+
+    def render_fast(self, mode, limit=None):
+        serializer = BookListFastSerializer({'readers': (mode, limit)})
+        self.assertTrue(serializer.is_supported())
+        rows = list(serializer.values(self.get_view(mode, limit).get_queryset()))
+        return JSONRenderer().render(serializer.to_representation(rows))
+
+    def test_same_bytes(self):
+        for mode, limit in ((READERS_ALL, None), (READERS_COUNT, None), (READERS_NONE, None),
+                            (READERS_TOP, 1), (READERS_TOP, 3)):
+            with self.subTest(mode=mode, limit=limit):
+                self.assertEqual(self.render_slow(mode, limit), self.render_fast(mode, limit))
+
+    def test_list_endpoint_same_bytes(self):
+        url = reverse('book-list')
+        for params in ({}, {'readers': 'count'}, {'readers': 'top:2'}, {'ordering': '-price', 'page_size': 2},
+                       {'search': 'Book', 'ordering': 'relevance'}):
+            with self.subTest(params=params):
+                cache.clear()
+                fast = self.client.get(url, data=params)
+                cache.clear()
+                with mock.patch.object(BookViewSet, 'fast_list_serializer_class', None):
+                    slow = self.client.get(url, data=params)
+                self.assertEqual(200, fast.status_code)
+                self.assertEqual(slow.content, fast.content)
+
+    def test_list_queries(self):
+        cache.clear()
+        # Session-less anonymous request: the page and its readers.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('book-list'))
+
+    def test_decimal_formatter(self):
+        field = BookSerializer().fields['price']
+        format_price = decimal_formatter(Book._meta.get_field('price'))
+        for value in (Decimal('0'), Decimal('0.5'), Decimal('1.005'), Decimal('1.015'), Decimal('12345.675'),
+                      25, 1.1, None):
+            with self.subTest(value=value):
+                expected = None if value is None else field.to_representation(value)
+                self.assertEqual(expected, format_price(value))
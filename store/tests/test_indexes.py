@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from store.leaderboards import LEADERBOARDS
+from store.models import Book, UserBookRelation
+from store.pagination import KeysetPagination
+
+
+class BookIndexesTestCase(APITestCase):
+    """
+    The queries behind the book and library endpoints are served by an index, not a full scan.
+    """
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='user')
+        for i in range(20):
+            book = Book.objects.create(name=f'Book {i}', price=Decimal(i % 5), author_name=f'Author {i % 3}')
+            UserBookRelation.objects.create(user=user, book=book, like=i % 2 == 0)
+
+    def explain(self, sql):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # The test tables are tiny; make the planner show the index it would use.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, sql, index):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No plan checks for {connection.vendor}')
+        plan = self.explain(sql)
+        self.assertIn(index, plan)
+        self.assertNotIn('Seq Scan', plan)
+        self.assertNotRegex(plan, r'(?m)SCAN (TABLE )?store_\w+\s*$')
+
+    def get_book_page_sql(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('book-list'), data=params)
+        self.assertEqual(200, response.status_code)
+        return next(query['sql'] for query in context.captured_queries
+                    if query['sql'].startswith('SELECT') and 'FROM "store_book"' in query['sql'])
+
+    def captured_sql(self, queryset):
+        with CaptureQueriesContext(connection) as context:
+            list(queryset)
+        return context.captured_queries[0]['sql']
+
+    def test_price_filter(self):
+        sql = self.captured_sql(Book.objects.filter(price=Decimal('2.00')).order_by('id')[:21])
+        self.assertUsesIndex(sql, 'store_book_price_id_idx')
+
+    def test_price_ordering(self):
+        for ordering in ('price', '-price'):
+            with self.subTest(ordering=ordering):
+                cursor = KeysetPagination.make_cursor('price', 5, Decimal('1.00'), reverse=ordering.startswith('-'))
+                sql = self.get_book_page_sql({'ordering': ordering, 'cursor': cursor})
+                self.assertUsesIndex(sql, 'store_book_price_id_idx')
+
+    def test_author_ordering(self):
+        for ordering in ('author_name', '-author_name'):
+            with self.subTest(ordering=ordering):
+                self.assertUsesIndex(self.get_book_page_sql({'ordering': ordering}), 'store_book_author_id_idx')
+
+    def test_top_readers(self):
+        # Each book's first readers come off the book foreign key index.
+        sql = self.captured_sql(UserBookRelation.objects.first_per_book([1, 2], 3).values_list('pk'))
+        self.assertUsesIndex(sql, 'store_userbookrelation_book_id')
+
+    def test_leaderboards(self):
+        for by, index in (('likes', 'store_book_likes_id_idx'), ('bookmarks', 'store_book_bookmarks_id_idx')):
+            with self.subTest(by=by):
+                field = LEADERBOARDS[by]
+                queryset = Book.objects.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', '-id')[:100]
+                self.assertUsesIndex(self.captured_sql(queryset.values_list('id', flat=True)), index)
+
+    def test_library(self):
+        user = User.objects.get()
+        for kind, index in (('liked', 'store_ubr_user_liked_idx'), ('bookmarked', 'store_ubr_user_bookmarked_idx'),
+                            ('rated', 'store_ubr_user_rated_idx')):
+            with self.subTest(kind=kind):
+                queryset = UserBookRelation.objects.library(user, kind).filter(id__gt=5).order_by('id')[:21]
+                self.assertUsesIndex(self.captured_sql(queryset), index)
@@ -0,0 +1,163 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase
+
+from store.models import Book, UserBookRelation, UserBookRelationQuerySet
+from store.signals import check_connections
+
+
+class BookCountersTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.book = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+
+    def assertCounters(self, likes, bookmarks, rating_sum, rating_count):
+        self.book.refresh_from_db()
+        self.assertEqual((likes, bookmarks, rating_sum, rating_count),
+                         (self.book.likes_count, self.book.bookmarks_count,
+                          self.book.rating_sum, self.book.rating_count))
+
+    def test_create(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user2, book=self.book, in_bookmarks=True, rate=2)
+        self.assertCounters(1, 1, 6, 2)
+        self.assertEqual(Decimal('3.00'), self.book.rating)
+
+    def test_update(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book, like=True, rate=4)
+
+        relation = UserBookRelation.objects.get(pk=relation.pk)
+        relation.like = False
+        relation.in_bookmarks = True
+        relation.rate = 5
+        relation.save()
+        self.assertCounters(0, 1, 5, 1)
+
+        relation.rate = None
+        relation.save()
+        self.assertCounters(0, 1, 0, 0)
+        self.assertEqual(Decimal('0.00'), self.book.rating)
+
+    def test_save_unchanged(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book, like=True)
+        relation.save()
+        UserBookRelation.objects.get(pk=relation.pk).save()
+        self.assertCounters(1, 0, 0, 0)
+
+    def test_delete(self):
+        relation = UserBookRelation.objects.create(user=self.user1, book=self.book, like=True, rate=3)
+        UserBookRelation.objects.create(user=self.user2, book=self.book, like=True)
+        relation.delete()
+        self.assertCounters(1, 0, 0, 0)
+
+        self.user2.delete()
+        self.assertCounters(0, 0, 0, 0)
+
+    def test_rebuild_command(self):
+        UserBookRelation.objects.create(user=self.user1, book=self.book, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user2, book=self.book, in_bookmarks=True, rate=1)
+        other = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        Book.objects.update(likes_count=10, bookmarks_count=10, rating_sum=10, rating_count=10)
+
+        call_command('rebuild_book_counters', batch_size=1, stdout=StringIO())
+
+        self.assertCounters(1, 1, 5, 2)
+        self.assertEqual(Decimal('2.50'), self.book.rating)
+        other.refresh_from_db()
+        self.assertEqual(0, other.likes_count)
+        self.assertEqual(0, other.rating_count)
+
+
+class UserBookRelationUpsertTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user1')
+        self.book = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+
+    def test_unique(self):
+        UserBookRelation.objects.create(user=self.user, book=self.book)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserBookRelation.objects.create(user=self.user, book=self.book)
+
+    def test_insert_then_update(self):
+        relation = UserBookRelation.objects.upsert(self.user, self.book.id, like=True)
+        self.assertEqual((True, False, None), (relation.like, relation.in_bookmarks, relation.rate))
+
+        updated = UserBookRelation.objects.upsert(self.user, self.book.id, rate=3)
+        self.assertEqual(relation.pk, updated.pk)
+        self.assertEqual((True, False, 3), (updated.like, updated.in_bookmarks, updated.rate))
+        self.assertEqual(1, UserBookRelation.objects.count())
+
+        self.book.refresh_from_db()
+        self.assertEqual((1, 3, 1), (self.book.likes_count, self.book.rating_sum, self.book.rating_count))
+
+    def test_empty_update(self):
+        UserBookRelation.objects.upsert(self.user, self.book.id, in_bookmarks=True)
+        relation = UserBookRelation.objects.upsert(self.user, self.book.id)
+        self.assertTrue(relation.in_bookmarks)
+        self.book.refresh_from_db()
+        self.assertEqual(1, self.book.bookmarks_count)
+
+    def test_queries(self):
+        UserBookRelation.objects.upsert(self.user, self.book.id, like=True)
+        # Savepoint, locked read, upsert, counter update, release.
+        with self.assertNumQueries(5):
+            UserBookRelation.objects.upsert(self.user, self.book.id, like=False)
+
+    def test_missing_book(self):
+        with self.assertRaises(Book.DoesNotExist):
+            UserBookRelation.objects.upsert(self.user, self.book.id + 1, like=True)
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_book_id_from_url(self):
+        relation = UserBookRelation.objects.upsert(self.user, str(self.book.id), like=True)
+        self.assertEqual(self.book.id, relation.book_id)
+
+    def test_bulk_apply_concurrent_insert(self):
+        other = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        lock_relations = UserBookRelationQuerySet._lock_relations
+
+        def insert_after_read(queryset, user, book_ids):
+            # Another transaction creates a relation right after the first locked read.
+            rows = lock_relations(queryset, user, book_ids)
+            if not UserBookRelation.objects.filter(book=self.book).exists():
+                UserBookRelation.objects.upsert(self.user, self.book.id, like=True, rate=2)
+            return rows
+
+        with mock.patch.object(UserBookRelationQuerySet, '_lock_relations', autospec=True,
+                               side_effect=insert_after_read):
+            relations = UserBookRelation.objects.bulk_apply(
+                self.user, {self.book.id: {'like': False, 'in_bookmarks': True}, other.id: {'like': True}})
+        self.assertEqual([(False, True, 2), (True, False, None)],
+                         [(relation.like, relation.in_bookmarks, relation.rate) for relation in relations])
+        self.assertTrue(all(relation.pk for relation in relations))
+        self.assertEqual([(0, 1, 2, 1), (1, 0, 0, 0)], list(Book.objects.order_by('id').values_list(
+            'likes_count', 'bookmarks_count', 'rating_sum', 'rating_count')))
+
+
+class ConnectionHealthCheckTestCase(SimpleTestCase):
+    def make_connection(self, usable, health_checks=True, connected=True):
+        connection = mock.Mock(settings_dict={'CONN_HEALTH_CHECKS': health_checks}, in_atomic_block=False)
+        connection.connection = object() if connected else None
+        connection.is_usable.return_value = usable
+        return connection
+
+    def test_check_connections(self):
+        broken = self.make_connection(usable=False)
+        healthy = self.make_connection(usable=True)
+        unchecked = self.make_connection(usable=False, health_checks=False)
+        closed = self.make_connection(usable=False, connected=False)
+        with mock.patch('store.signals.connections') as connections:
+            connections.all.return_value = [broken, healthy, unchecked, closed]
+            check_connections()
+
+        broken.close.assert_called_once_with()
+        for connection in (healthy, unchecked, closed):
+            connection.close.assert_not_called()
+        unchecked.is_usable.assert_not_called()
+        closed.is_usable.assert_not_called()
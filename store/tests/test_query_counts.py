@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from store.benchmarks import compare_reports, seed_catalogue
+from store.models import Book
+from store.search import get_search_backend
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    The number of queries of every endpoint must not depend on how many rows it returns.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_catalogue(120, users=60).first()
+
+    def setUp(self):
+        cache.clear()
+        # Picking the search backend may inspect the schema once per process; keep it out of the counts.
+        get_search_backend(Book)
+
+    def count_queries(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data=params)
+        self.assertEqual(200, response.status_code, response.content)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, params):
+        url = reverse('book-list')
+        counts = {page_size: self.count_queries(url, {**params, 'page_size': page_size}) for page_size in (1, 10, 100)}
+        self.assertEqual(1, len(set(counts.values())), f'{params}: {counts}')
+
+    def test_list(self):
+        for params in [{}, {'readers': 'count'}, {'readers': 'top:3'}, {'readers': 'none'},
+                       {'search': 'stone'}, {'search': 'st'}, {'ordering': '-price'}, {'ordering': 'author_name'},
+                       {'ordering': '-rating'}, {'search': 'river', 'ordering': 'relevance'}]:
+            self.assertConstantQueries(params)
+
+    def test_list_authenticated(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries({})
+
+    def test_detail(self):
+        popular = Book.objects.order_by('-likes_count').first()
+        unpopular = Book.objects.order_by('likes_count').first()
+        self.assertEqual(self.count_queries(reverse('book-detail', args=(unpopular.id,)), {}),
+                         self.count_queries(reverse('book-detail', args=(popular.id,)), {}))
+
+
+class CompareReportsTestCase(APITestCase):
+    def report(self, queries=4, p95_ms=10.0, by_page_size=None):
+        return {'results': {'1000': {'list': {'queries': queries, 'p50_ms': 5.0, 'p95_ms': p95_ms, 'peak_kib': 100.0,
+                                              'queries_by_page_size': by_page_size or {'10': 4, '100': 4}}}}}
+
+    def test_no_regression(self):
+        self.assertEqual([], compare_reports(self.report(p95_ms=11.0), self.report(), tolerance=0.25))
+        # Timings are only compared on request.
+        self.assertEqual([], compare_reports(self.report(p95_ms=20.0), self.report()))
+
+    def test_regressions(self):
+        self.assertEqual(1, len(compare_reports(self.report(queries=5), self.report())))
+        self.assertEqual(1, len(compare_reports(self.report(p95_ms=20.0), self.report(), tolerance=0.25)))
+        self.assertEqual(1, len(compare_reports(self.report(by_page_size={'10': 4, '100': 94}), {})))
@@ -0,0 +1,101 @@
+import datetime
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, modify_settings
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.test import APITestCase
+
+from store.models import Book, UserBookRelation
+from store.renderers import FastJSONRenderer
+from store.views import BookViewSet
+
+DATA = {
+    'price': Decimal('25.50'),
+    'text': 'Книга "1"    \\ </script>',
+    'when': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+    'day': datetime.date(2024, 1, 2),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'lazy': gettext_lazy('Not found.'),
+    'nested': [{'a': 1, 'b': None, 'c': True, 'd': 1.5}, []],
+}
+
+
+class FastJSONRendererTestCase(SimpleTestCase):
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(JSONRenderer().render(data, accepted_media_type),
+                         FastJSONRenderer().render(data, accepted_media_type))
+
+    def test_same_bytes(self):
+        self.assertSameOutput(DATA)
+        self.assertSameOutput([DATA, DATA])
+        self.assertSameOutput(None)
+
+    def test_fallbacks(self):
+        # Out of orjson's integer range, integer keys and indented output.
+        self.assertSameOutput({'big': 2 ** 70})
+        self.assertSameOutput({1: 'one'})
+        self.assertSameOutput(DATA, 'application/json; indent=4')
+        with mock.patch('store.renderers.orjson', None):
+            self.assertSameOutput(DATA)
+
+    def test_render_stream(self):
+        renderer = FastJSONRenderer()
+        renderer.stream_chunk_size = 2
+        items = [{'id': i, 'price': Decimal(i)} for i in range(5)]
+        for data in ({'next': 'http://testserver/?cursor=x', 'previous': None}, {}):
+            with self.subTest(data=data):
+                chunks = list(renderer.render_stream(data, 'results', iter(items)))
+                self.assertEqual(renderer.render({**data, 'results': items}), b''.join(chunks))
+                self.assertEqual(5, len(chunks))
+        self.assertEqual(b'{"results":[]}', b''.join(renderer.render_stream({}, 'results', [])))
+
+
+class BooksStreamTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='user', first_name='Ivan', last_name='Petrov')
+        for i in range(30):
+            book = Book.objects.create(name=f'Book {i}', price=Decimal(i) / 4, author_name='Author')
+            UserBookRelation.objects.create(user=user, book=book, like=True)
+
+    def assertSameResults(self, content, streamed_content):
+        # The links differ by the `stream` parameter, so the next page is streamed too.
+        self.assertIn(b'stream=', streamed_content.split(b'"results":')[0])
+        self.assertEqual(content.split(b'"results":')[1], streamed_content.split(b'"results":')[1])
+
+    def test_stream(self):
+        url = reverse('book-list')
+        for params in ({'page_size': 25}, {'page_size': 25, 'readers': 'count'}, {'ordering': '-price'}):
+            with self.subTest(params=params):
+                cache.clear()
+                response = self.client.get(url, data=params)
+                cache.clear()
+                streamed = self.client.get(url, data={**params, 'stream': 'true'})
+                self.assertTrue(streamed.streaming)
+                self.assertEqual('application/json', streamed['Content-Type'])
+                self.assertSameResults(response.content, b''.join(streamed.streaming_content))
+
+    def test_stream_regular_serializer(self):
+        url = reverse('book-list')
+        cache.clear()
+        response = self.client.get(url)
+        cache.clear()
+        with mock.patch('store.views.BookViewSet.fast_list_serializer_class', None):
+            streamed = self.client.get(url, data={'stream': '1'})
+        self.assertTrue(streamed.streaming)
+        self.assertSameResults(response.content, b''.join(streamed.streaming_content))
+
+    # The browsable API renders django-filter's form template.
+    @modify_settings(INSTALLED_APPS={'append': 'django_filters'})
+    def test_browsable_api_not_streamed(self):
+        with mock.patch.object(BookViewSet, 'renderer_classes', [FastJSONRenderer, BrowsableAPIRenderer]):
+            response = self.client.get(reverse('book-list'), data={'stream': 'true'}, HTTP_ACCEPT='text/html')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertFalse(response.streaming)
@@ -0,0 +1,99 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.cache import CATALOGUE_MODIFIED_KEY
+from store.models import Book
+from store.routers import STICKY_KEY_PREFIX
+
+
+@override_settings(STORE_READ_REPLICA='replica')
+class ReplicaRoutingTestCase(APITestCase):
+    # Two SQLite databases: rows written only to `replica` show which one a request read.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+        self.book = Book.objects.create(name='primary_book', price=25, author_name='Author 1', owner=self.user)
+        Book.objects.using('replica').create(id=self.book.id, name='replica_book', price=25, author_name='Author 1')
+
+    def get_names(self, url=None):
+        response = self.client.get(url or reverse('book-list'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [book['name'] for book in json.loads(response.content)['results']]
+
+    def test_reads_from_replica(self):
+        self.assertEqual(['replica_book'], self.get_names())
+        response = self.client.get(reverse('book-detail', args=(self.book.id,)))
+        self.assertEqual('replica_book', response.data['name'])
+        response = self.client.head(reverse('book-list'))
+        self.assertEqual('1', response['X-Total-Count'])
+
+    def test_export_from_replica(self):
+        response = self.client.get(reverse('book-export'))
+        self.assertEqual(['replica_book'], [json.loads(line)['name'] for line in
+                                            b''.join(response.streaming_content).splitlines()])
+
+    def test_streamed_list_from_replica(self):
+        response = self.client.get(reverse('book-list'), data={'stream': 1})
+        self.assertTrue(response.streaming)
+        self.assertEqual(['replica_book'], [book['name'] for book in
+                                            json.loads(b''.join(response.streaming_content))['results']])
+
+    def test_writes_to_primary(self):
+        self.client.force_login(self.user)
+        # The owner check reads the book from the primary, where it belongs to the user.
+        response = self.client.patch(reverse('book-detail', args=(self.book.id,)), data={'price': '30.00'},
+                                     format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('primary_book', response.data['name'])
+        self.assertEqual(30, Book.objects.using('default').get().price)
+        self.assertEqual(25, Book.objects.using('replica').get().price)
+
+    def test_sticky_after_write(self):
+        self.client.force_login(self.user)
+        self.client.patch(reverse('userbookrelation-detail', args=(self.book.id,)), data={'like': True},
+                          format='json')
+        self.assertEqual(['primary_book'], self.get_names())
+        self.assertEqual([self.book.id], [item['book']['id'] for item in
+                                          self.client.get(reverse('userbookrelation-mine')).data['results']])
+
+        # Other users still read the replica, and so does the writer once the window is over.
+        # (New queries: the page cached while sticky is fresher than the replica anyway.)
+        self.client.force_login(self.other)
+        self.assertEqual(['replica_book'], self.get_names(reverse('book-list') + '?page_size=3'))
+        cache.delete(f'{STICKY_KEY_PREFIX}:{self.user.pk}')
+        self.client.force_login(self.user)
+        self.assertEqual(['replica_book'], self.get_names(reverse('book-list') + '?page_size=5'))
+
+    def test_not_cached_while_replica_may_lag(self):
+        # The books were just written: the replica may not have them yet.
+        for _ in range(2):
+            response = self.client.get(reverse('book-list'))
+            self.assertNotIn('X-Cache', response)
+            self.assertNotIn('ETag', response)
+
+        cache.set(CATALOGUE_MODIFIED_KEY, time.time() - 60, timeout=None)
+        self.assertEqual('MISS', self.client.get(reverse('book-list'))['X-Cache'])
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual('HIT', response['X-Cache'])
+        self.assertIn('ETag', response)
+
+    def test_failed_write_not_sticky(self):
+        self.client.force_login(self.other)
+        response = self.client.patch(reverse('book-detail', args=(self.book.id,)), data={'price': '30.00'},
+                                     format='json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertEqual(['replica_book'], self.get_names())
+
+    @override_settings(STORE_READ_REPLICA=None)
+    def test_disabled(self):
+        self.assertEqual(['primary_book'], self.get_names())
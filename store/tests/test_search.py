@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from store.models import Book
+from store.search import SimpleSearchBackend, SQLiteSearchBackend, get_search_backend
+
+
+class SearchBackendTestCase(TestCase):
+    def setUp(self):
+        Book.objects.create(name='The Rolling Stones', price=25, author_name='Keith Richards')
+        Book.objects.create(name='Rolling in the Deep', price=45, author_name='Adele Adkins')
+        Book.objects.create(name='Python 3', price=65, author_name="O'Reilly")
+        Book.objects.create(name='Stone soup', price=10, author_name='Marcia Brown')
+        Book.objects.create(name='test_book Author 1', price=15, author_name='Author 2')
+        Book.objects.create(name='Война и мир', price=30, author_name='Лев Толстой')
+
+    def assertSameAsIcontains(self, *terms):
+        backend = get_search_backend(Book)
+        expected = SimpleSearchBackend().filter(Book.objects.order_by('id'), terms)
+        actual = backend.filter(Book.objects.order_by('id'), terms)
+        self.assertEqual(list(expected.values_list('id', flat=True)), list(actual.values_list('id', flat=True)),
+                         terms)
+
+    def test_backend(self):
+        if connection.vendor == 'sqlite':
+            self.assertIsInstance(get_search_backend(Book), SQLiteSearchBackend)
+
+    def test_same_results_as_icontains(self):
+        for terms in [('rolling',), ('ROLL', 'stone'), ('olli',), ('ton',), ('3',), ('o',), ("O'Re",),
+                      ('Author 1',), ('Author', '1'), ('"quoted"',), ('nothing here',), ('ing', 'dee', 'ad'),
+                      ('Войн',), ('войн',), ('ТОЛСТОЙ',)]:
+            self.assertSameAsIcontains(*terms)
+
+    def test_lookups(self):
+        backend = get_search_backend(Book)
+        self.assertEqual(1, backend.filter(Book.objects.all(), ['keith']).count())
+        self.assertEqual(0, backend.filter(Book.objects.all(), ['keith'], ['name__icontains']).count())
+        self.assertEqual(1, backend.filter(Book.objects.all(), ['the rolling stones'], ['name__iexact']).count())
+
+    def test_index_follows_writes(self):
+        book = Book.objects.get(name='Python 3')
+        book.name = 'Fluent Python'
+        book.save()
+        self.assertSameAsIcontains('fluent')
+        self.assertEqual(1, get_search_backend(Book).filter(Book.objects.all(), ['fluent']).count())
+        self.assertEqual(0, get_search_backend(Book).filter(Book.objects.all(), ['python 3']).count())
+
+        Book.objects.filter(name='Stone soup').delete()
+        self.assertEqual(1, get_search_backend(Book).filter(Book.objects.all(), ['stone']).count())
+
+        Book.objects.bulk_create([Book(name='Soup stones', price=1, author_name='Nobody')])
+        self.assertEqual(2, get_search_backend(Book).filter(Book.objects.all(), ['stone']).count())
+
+
+class BooksSearchApiTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.book1 = Book.objects.create(name='Something else', price=25, author_name='Rolling')
+        self.book2 = Book.objects.create(name='Rolling', price=45, author_name='Rolling Rolling')
+        self.book3 = Book.objects.create(name='Unrelated', price=65, author_name='Nobody')
+
+    def test_search(self):
+        response = self.client.get(reverse('book-list'), data={'search': 'rolling'})
+        self.assertEqual([self.book1.id, self.book2.id], [book['id'] for book in response.data['results']])
+
+    def test_relevance(self):
+        response = self.client.get(reverse('book-list'), data={'search': 'rolling', 'ordering': 'relevance',
+                                                                'page_size': 1})
+        self.assertEqual([self.book2.id], [book['id'] for book in response.data['results']])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([self.book1.id], [book['id'] for book in response.data['results']])
+        self.assertIsNone(response.data['next'])
@@ -1,4 +1,3 @@
-from django.db.models import Count, Case, When
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
 
@@ -18,14 +17,13 @@ class BookSerializerTestCase(APITestCase):
 
 
     def test_ok(self):
-        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True)
-        UserBookRelation.objects.create(user=self.user2, book=self.book1, like=True)
-        UserBookRelation.objects.create(user=self.user3, book=self.book1, like=True)
+        UserBookRelation.objects.create(user=self.user1, book=self.book1, like=True, rate=5)
+        UserBookRelation.objects.create(user=self.user2, book=self.book1, like=True, rate=4)
+        UserBookRelation.objects.create(user=self.user3, book=self.book1, like=True, rate=4)
 
         UserBookRelation.objects.create(user=self.user1, book=self.book2, like=False)
 
-        books = Book.objects.all().annotate(
-            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1)))).order_by('id')
+        books = Book.objects.all().order_by('id')
         data = BookSerializer(books, many=True).data
 
         # data = BookSerializer([self.book1, self.book2], many=True).data
@@ -40,6 +38,8 @@ class BookSerializerTestCase(APITestCase):
                 'author_name': 'Author 1',
                 # 'likes_count': 3,
                 'annotated_likes': 3,
+                'rating': '4.33',
+                'rating_count': 3,
                 'owner_name': '',
                 'readers': [
                     {
@@ -64,6 +64,8 @@ class BookSerializerTestCase(APITestCase):
                 'author_name': 'Author 2',
                 # 'likes_count': 0,
                 'annotated_likes': 0,
+                'rating': '0.00',
+                'rating_count': 0,
                 'owner_name': '',
                 'readers': [
                     {
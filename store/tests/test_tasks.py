@@ -0,0 +1,152 @@
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from store.models import Book, BookQuerySet, Task, UserBookRelation
+from store.tasks import ThreadPoolTaskQueue, defer, get_task_queue, task
+
+calls = Counter()
+
+
+@task
+def count_call(key):
+    calls[key] += 1
+
+
+@task
+def fail(key):
+    raise ValueError(key)
+
+
+DATABASE_QUEUE = {'BACKEND': 'store.tasks.DatabaseTaskQueue', 'OPTIONS': {'delay': 0}}
+THREAD_POOL_QUEUE = {'BACKEND': 'store.tasks.ThreadPoolTaskQueue', 'OPTIONS': {'workers': 2, 'delay': 0.2}}
+
+
+class ThreadPoolTaskQueueTestCase(TestCase):
+    def setUp(self):
+        calls.clear()
+        self.queue = ThreadPoolTaskQueue(workers=2, delay=0.2)
+
+    def test_coalesced(self):
+        for _ in range(50):
+            self.queue.enqueue('count_call', 1)
+        self.queue.enqueue('count_call', 2)
+        self.assertTrue(self.queue.join(timeout=5))
+        self.assertEqual({1: 1, 2: 1}, dict(calls))
+
+    def test_enqueued_after_start(self):
+        self.queue.enqueue('count_call', 1)
+        self.assertTrue(self.queue.join(timeout=5))
+        self.queue.enqueue('count_call', 1)
+        self.assertTrue(self.queue.join(timeout=5))
+        self.assertEqual({1: 2}, dict(calls))
+
+    def test_failure_logged(self):
+        with self.assertLogs('store.tasks', 'ERROR'):
+            self.queue.enqueue('fail', 1)
+            self.assertTrue(self.queue.join(timeout=5))
+
+
+@override_settings(STORE_DEFERRED_COUNTERS=True, STORE_TASK_QUEUE=THREAD_POOL_QUEUE)
+class DeferredCountersTestCase(TransactionTestCase):
+    # Pool threads can't see a test transaction.
+
+    def setUp(self):
+        cache.clear()
+        self.book = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.users = [User.objects.create(username=f'user{i}') for i in range(50)]
+
+    def test_burst_recounted_once(self):
+        rebuild_counters = BookQuerySet.rebuild_counters
+        with mock.patch.object(BookQuerySet, 'rebuild_counters', autospec=True,
+                               side_effect=rebuild_counters) as rebuild, mock.patch('store.tasks.time') as clock:
+            # The queue's clock stands still during the burst, however slow it is.
+            clock.monotonic.return_value = 1000.0
+            for user in self.users:
+                UserBookRelation.objects.upsert(user, self.book.id, like=True, rate=4)
+            self.assertEqual(0, Book.objects.get().likes_count)
+
+            queue = get_task_queue()
+            with queue.condition:
+                clock.monotonic.return_value = 2000.0
+                queue.condition.notify_all()
+            self.assertTrue(queue.join(timeout=5))
+        self.assertEqual(1, rebuild.call_count)
+        book = Book.objects.get()
+        self.assertEqual((50, 200, 50), (book.likes_count, book.rating_sum, book.rating_count))
+
+    def test_save_deferred(self):
+        UserBookRelation.objects.create(user=self.users[0], book=self.book, like=True)
+        self.assertEqual(0, Book.objects.get().likes_count)
+        self.assertTrue(get_task_queue().join(timeout=5))
+        self.assertEqual(1, Book.objects.get().likes_count)
+
+    def test_batch_and_delete(self):
+        other = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        UserBookRelation.objects.bulk_apply(self.users[0], {self.book.id: {'like': True}, other.id: {'like': True}})
+        self.assertTrue(get_task_queue().join(timeout=5))
+        self.assertEqual([1, 1], list(Book.objects.order_by('id').values_list('likes_count', flat=True)))
+
+        UserBookRelation.objects.filter(user=self.users[0]).delete()
+        self.assertTrue(get_task_queue().join(timeout=5))
+        self.assertEqual([0, 0], list(Book.objects.order_by('id').values_list('likes_count', flat=True)))
+
+
+@override_settings(STORE_DEFERRED_COUNTERS=True, STORE_TASK_QUEUE=DATABASE_QUEUE)
+class DatabaseTaskQueueTestCase(TestCase):
+    def setUp(self):
+        calls.clear()
+        self.book = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+
+    def test_coalesced_in_transaction(self):
+        for user in self.users:
+            UserBookRelation.objects.upsert(user, self.book.id, like=True)
+        self.assertEqual(1, Task.objects.count())
+        self.assertEqual(0, Book.objects.get().likes_count)
+
+        call_command('run_tasks', '--once', stdout=mock.Mock())
+        self.assertEqual(3, Book.objects.get().likes_count)
+        self.assertFalse(Task.objects.exists())
+
+    def test_rolled_back(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            UserBookRelation.objects.upsert(self.users[0], self.book.id, like=True)
+            raise ValueError
+        self.assertFalse(Task.objects.exists())
+
+    def test_enqueued_while_running(self):
+        queue = get_task_queue()
+        defer(count_call, 1)
+        claimed = queue.claim(10)
+        defer(count_call, 1)
+        # The running task may have missed the second write, so it gets a run of its own.
+        self.assertEqual(2, Task.objects.count())
+        self.assertEqual(1, len(claimed))
+        self.assertEqual(1, len(queue.claim(10)))
+
+    def test_retry(self):
+        queue = get_task_queue()
+        defer(fail, 1)
+        with self.assertLogs('store.tasks', 'ERROR'):
+            self.assertEqual(1, queue.run_pending())
+        row = Task.objects.get()
+        self.assertIsNone(row.claimed_at)
+        self.assertGreater(row.run_after, timezone.now())
+        self.assertEqual(0, queue.run_pending())
+
+    def test_stale_claim(self):
+        queue = get_task_queue()
+        defer(count_call, 1)
+        queue.claim(10)
+        self.assertEqual(0, queue.run_pending())
+        Task.objects.update(claimed_at=timezone.now() - timedelta(seconds=queue.claim_timeout + 1))
+        self.assertEqual(1, queue.run_pending())
+        self.assertEqual({1: 1}, dict(calls))
@@ -0,0 +1,78 @@
+import json
+import warnings
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APITestCase
+
+from store.models import Book
+from store.timing import get_timing_histograms, histograms, reset_timing_histograms
+
+
+class RequestTimingTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        histograms.flush()
+        reset_timing_histograms()
+        user = User.objects.create(username='user')
+        Book.objects.create(name='test_book1', price=25, author_name='Author 1', owner=user)
+        self.route = 'GET ' + resolve(reverse('book-list')).route
+
+    def get_metrics(self, response):
+        metrics = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_header(self):
+        response = self.client.get(reverse('book-list'))
+        metrics = self.get_metrics(response)
+        self.assertEqual(['db', 'serialize', 'render', 'total'], list(metrics))
+        self.assertEqual('"2 queries"', metrics['db']['desc'])
+        self.assertGreater(float(metrics['render']['dur']), 0)
+        self.assertGreater(float(metrics['serialize']['dur']), 0)
+        self.assertGreaterEqual(float(metrics['total']['dur']), float(metrics['db']['dur']))
+
+    def test_detail_serializer_timed(self):
+        book = Book.objects.get()
+        response = self.client.get(reverse('book-detail', args=(book.id,)))
+        self.assertGreater(float(self.get_metrics(response)['serialize']['dur']), 0)
+
+    @override_settings(STORE_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertNotIn('Server-Timing', response)
+        histograms.flush()
+        self.assertEqual({}, get_timing_histograms())
+
+    def test_log(self):
+        with self.assertLogs('store.timing', 'INFO') as logs:
+            self.client.get(reverse('book-list'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(self.route, line['route'])
+        self.assertEqual(200, line['status'])
+        self.assertEqual(2, line['queries'])
+
+    def test_histograms(self):
+        for _ in range(3):
+            self.client.get(reverse('book-list'), data={'readers': 'none'})
+        with warnings.catch_warnings():
+            # Keys must be valid on memcached too.
+            warnings.simplefilter('error', CacheKeyWarning)
+            histograms.flush()
+
+        stats = get_timing_histograms()[self.route]
+        self.assertEqual(3, stats['count'])
+        self.assertEqual(3, sum(stats['total']['buckets'].values()))
+        self.assertEqual(3, sum(stats['queries']['buckets'].values()))
+
+        out = StringIO()
+        call_command('dump_request_timings', '--reset', stdout=out)
+        self.assertIn(self.route, out.getvalue())
+        self.assertEqual({}, get_timing_histograms())
@@ -0,0 +1,250 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store.models import Book, UserBookRelation
+from store.write_buffer import RelationWriteBuffer, get_relation_buffer
+
+
+class JournalDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir)
+
+    def journal_files(self):
+        return sorted(os.listdir(self.journal_dir))
+
+
+class RelationWriteBufferTestCase(JournalDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create(username=f'user{i}') for i in range(2)]
+        self.book1 = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.book2 = Book.objects.create(name='test_book2', price=45, author_name='Author 2')
+        self.buffer = RelationWriteBuffer(self.journal_dir, flush_interval=None)
+
+    def get_relations(self):
+        return {(relation.user_id, relation.book_id): (relation.like, relation.in_bookmarks)
+                for relation in UserBookRelation.objects.all()}
+
+    def test_last_write_wins(self):
+        user = self.users[0].pk
+        self.buffer.put(user, self.book1.pk, {'like': True})
+        self.buffer.put(user, self.book1.pk, {'in_bookmarks': True})
+        self.assertEqual({'like': False, 'in_bookmarks': True},
+                         self.buffer.put(user, self.book1.pk, {'like': False}))
+        self.assertFalse(UserBookRelation.objects.exists())
+
+        self.assertEqual(1, self.buffer.flush())
+        self.assertEqual({(user, self.book1.pk): (False, True)}, self.get_relations())
+        self.assertEqual([], self.journal_files())
+
+    def test_flush_counters(self):
+        for user in self.users:
+            self.buffer.put(user.pk, self.book1.pk, {'like': True})
+        self.buffer.put(self.users[0].pk, self.book2.pk, {'in_bookmarks': True})
+        self.assertEqual(3, self.buffer.flush())
+        self.assertEqual([(2, 0), (0, 1)],
+                         list(Book.objects.order_by('id').values_list('likes_count', 'bookmarks_count')))
+
+    def test_bounded(self):
+        buffer = RelationWriteBuffer(self.journal_dir, flush_interval=None, max_size=2)
+        buffer.put(self.users[0].pk, self.book1.pk, {'like': True})
+        buffer.put(self.users[0].pk, self.book1.pk, {'like': False})
+        self.assertFalse(UserBookRelation.objects.exists())
+        buffer.put(self.users[0].pk, self.book2.pk, {'like': True})
+        self.assertEqual(2, UserBookRelation.objects.count())
+        self.assertEqual({}, buffer.pending)
+
+    def test_deleted_book(self):
+        self.buffer.put(self.users[0].pk, self.book1.pk, {'like': True})
+        self.buffer.put(self.users[0].pk, self.book2.pk, {'like': True})
+        self.book2.delete()
+        self.buffer.flush()
+        self.assertEqual({(self.users[0].pk, self.book1.pk): (True, False)}, self.get_relations())
+
+    def test_failed_flush_kept(self):
+        user = self.users[0].pk
+        self.buffer.put(user, self.book1.pk, {'like': True, 'in_bookmarks': True})
+        with mock.patch('store.write_buffer.apply_relation_changes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.buffer.put(user, self.book1.pk, {'like': False})
+        self.assertEqual({'like': False, 'in_bookmarks': True}, self.buffer.get(user, self.book1.pk))
+        self.assertEqual(2, len(self.journal_files()))
+
+        self.buffer.flush()
+        self.assertEqual({(user, self.book1.pk): (False, True)}, self.get_relations())
+        self.assertEqual([], self.journal_files())
+
+    def test_crash_recovery(self):
+        user = self.users[0].pk
+        self.buffer.put(user, self.book1.pk, {'like': True})
+        self.buffer.put(user, self.book2.pk, {'in_bookmarks': True})
+        self.buffer.put(user, self.book1.pk, {'like': False, 'in_bookmarks': True})
+        # The process dies: nothing was flushed, and the last write was cut off mid-line.
+        self.buffer.journal.write('{"user": 1, "bo')
+        self.buffer.journal.close()
+        del self.buffer
+
+        buffer = RelationWriteBuffer(self.journal_dir, flush_interval=None)
+        self.assertEqual(2, buffer.recover())
+        self.assertEqual({(user, self.book1.pk): (False, True), (user, self.book2.pk): (False, True)},
+                         self.get_relations())
+        self.assertEqual((0, 1), Book.objects.filter(pk=self.book1.pk).values_list(
+            'likes_count', 'bookmarks_count').get())
+        self.assertEqual([], self.journal_files())
+        # Replaying again changes nothing.
+        self.assertEqual(0, buffer.recover())
+
+    def test_flush_user(self):
+        first, second = (user.pk for user in self.users)
+        self.buffer.put(first, self.book1.pk, {'like': True})
+        self.buffer.put(second, self.book1.pk, {'like': True})
+        self.buffer.put(second, self.book2.pk, {'in_bookmarks': True})
+
+        self.buffer.flush_user(first)
+        self.assertEqual({(first, self.book1.pk): (True, False)}, self.get_relations())
+        self.assertEqual({second: {self.book1.pk: {'like': True}, self.book2.pk: {'in_bookmarks': True}}},
+                         self.buffer.pending)
+        # A later synchronous write must survive a replay of the journal.
+        UserBookRelation.objects.filter(user=first).update(like=False)
+
+        buffer = RelationWriteBuffer(self.journal_dir, flush_interval=None)
+        self.assertEqual(2, buffer.recover())
+        self.assertEqual({(first, self.book1.pk): (False, False), (second, self.book1.pk): (True, False),
+                          (second, self.book2.pk): (False, True)}, self.get_relations())
+
+    def test_segments_removed(self):
+        first, second = (user.pk for user in self.users)
+        self.buffer.put(first, self.book1.pk, {'like': True})
+        self.buffer.put(second, self.book1.pk, {'like': True})
+        self.buffer.flush_user(second)
+        # `first` still has a line in the only segment.
+        self.assertEqual(1, len(self.journal_files()))
+        self.buffer.flush_user(first)
+        self.buffer.flush()
+        self.assertEqual([], self.journal_files())
+
+    def test_journal_lines(self):
+        self.buffer.put(self.users[0].pk, self.book1.pk, {'like': True})
+        [name] = self.journal_files()
+        with open(os.path.join(self.journal_dir, name)) as journal:
+            self.assertEqual({'seq': 1, 'user': self.users[0].pk, 'book': self.book1.pk, 'values': {'like': True}},
+                             json.loads(journal.readline()))
+
+
+class BufferedRelationApiTestCase(JournalDirMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+        self.book = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        self.url = reverse('userbookrelation-detail', args=(self.book.id,))
+        settings = override_settings(STORE_RELATION_BUFFER={'JOURNAL_DIR': self.journal_dir, 'FLUSH_INTERVAL': 0})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_acknowledged(self):
+        self.client.force_login(self.user)
+        response = self.client.patch(self.url, data={'like': True}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'id': None, 'book': self.book.id, 'like': True, 'in_bookmarks': False, 'rate': None},
+                         response.data)
+        self.assertFalse(UserBookRelation.objects.exists())
+
+    def test_same_shape_as_synchronous(self):
+        relation = UserBookRelation.objects.create(user=self.user, book=self.book, rate=3)
+        self.client.force_login(self.user)
+        response = self.client.patch(self.url, data={'in_bookmarks': True}, format='json')
+        self.assertEqual({'id': relation.id, 'book': self.book.id, 'like': False, 'in_bookmarks': True, 'rate': 3},
+                         response.data)
+        self.assertFalse(UserBookRelation.objects.get().in_bookmarks)
+
+    def test_toggles_coalesced(self):
+        self.client.force_login(self.user)
+        self.client.patch(self.url, data={'like': True}, format='json')
+        self.client.patch(self.url, data={'in_bookmarks': True}, format='json')
+        response = self.client.patch(self.url, data={'like': False}, format='json')
+        self.assertEqual((False, True), (response.data['like'], response.data['in_bookmarks']))
+        self.assertFalse(UserBookRelation.objects.exists())
+
+        get_relation_buffer().flush()
+        relation = UserBookRelation.objects.get()
+        self.assertEqual((False, True), (relation.like, relation.in_bookmarks))
+
+    def test_rate_after_buffered_toggle(self):
+        self.client.force_login(self.user)
+        self.client.patch(self.url, data={'like': True}, format='json')
+        self.client.patch(self.url, data={'like': False, 'rate': 4}, format='json')
+        get_relation_buffer().flush()
+        relation = UserBookRelation.objects.get()
+        self.assertEqual((False, 4), (relation.like, relation.rate))
+
+    def test_rate_written_in_request(self):
+        self.client.force_login(self.user)
+        response = self.client.patch(self.url, data={'like': True, 'rate': 4}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(4, UserBookRelation.objects.get().rate)
+
+    def test_missing_book(self):
+        self.client.force_login(self.user)
+        response = self.client.patch(reverse('userbookrelation-detail', args=(self.book.id + 1,)),
+                                     data={'like': True}, format='json')
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_read_your_writes(self):
+        self.client.force_login(self.other)
+        self.client.get(reverse('book-list'))
+
+        self.client.force_login(self.user)
+        self.client.patch(self.url, data={'like': True}, format='json')
+        self.client.force_login(self.other)
+        self.client.get(reverse('book-list'))
+        self.assertFalse(UserBookRelation.objects.exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('book-list'), data={'fields': 'annotated_likes,my_relation'})
+        self.assertEqual({'like': True, 'in_bookmarks': False, 'rate': None},
+                         response.data['results'][0]['my_relation'])
+        self.assertEqual(1, response.data['results'][0]['annotated_likes'])
+
+    def test_replay_command(self):
+        self.client.force_login(self.user)
+        self.client.patch(self.url, data={'in_bookmarks': True}, format='json')
+        get_relation_buffer().journal.close()
+        with override_settings(STORE_RELATION_BUFFER={'JOURNAL_DIR': self.journal_dir, 'FLUSH_INTERVAL': 0}):
+            call_command('replay_relation_journal', stdout=mock.Mock())
+        self.assertTrue(UserBookRelation.objects.get().in_bookmarks)
+
+
+class RelationBufferFlusherTestCase(JournalDirMixin, TransactionTestCase):
+    # The flusher thread can't see a test transaction.
+
+    def test_flushed_periodically(self):
+        user = User.objects.create(username='user')
+        book = Book.objects.create(name='test_book1', price=25, author_name='Author 1')
+        buffer = RelationWriteBuffer(self.journal_dir, flush_interval=0.1)
+        self.addCleanup(buffer.stop)
+        buffer.put(user.pk, book.pk, {'like': True})
+
+        deadline = time.monotonic() + 5
+        while (buffer.has_pending(user.pk) or buffer.flushing_users) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # Query only once the flusher is done: SQLite can report the table locked while it writes.
+        buffer.stopped.set()
+        buffer.flusher.join()
+        self.assertEqual(1, Book.objects.get().likes_count)
@@ -0,0 +1,279 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers
+
+logger = logging.getLogger('store.timing')
+
+TIMING_ROUTES_KEY = 'store:timing:routes'
+TIMING_KEY_PREFIX = 'store:timing'
+SECTIONS = ('db', 'serialize', 'render')
+METRICS = ('total', *SECTIONS, 'queries')
+# Upper bounds of the histogram buckets: milliseconds, and queries for `queries`.
+DURATION_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+OVERFLOW_BUCKET = '+Inf'
+
+_current_timing = contextvars.ContextVar('store_request_timing', default=None)
+
+
+class RequestTiming:
+    """
+    Durations of one request. Doubles as a database execute wrapper that counts queries
+    and their time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(SECTIONS, 0.0)
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            self.queries += 1
+
+    def metrics(self):
+        """
+        Milliseconds per section and the query count. Sections overlap where serializing
+        runs queries.
+        """
+        metrics = {'total': round((time.perf_counter() - self.started) * 1000, 3)}
+        metrics.update((name, round(seconds * 1000, 3)) for name, seconds in self.durations.items())
+        metrics['queries'] = self.queries
+        return metrics
+
+
+@contextmanager
+def timed(section):
+    """
+    Add the time spent in the block to `section` of the current request, if it is timed.
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.durations[section] += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+def server_timing(metrics):
+    entries = [f'{name};dur={metrics[name]}' for name in SECTIONS]
+    entries[0] += f';desc="{metrics["queries"]} queries"'
+    entries.append(f'total;dur={metrics["total"]}')
+    return ', '.join(entries)
+
+
+def metric_buckets(metric):
+    return QUERY_BUCKETS if metric == 'queries' else DURATION_BUCKETS
+
+
+def bucket_for(metric, value):
+    for bound in metric_buckets(metric):
+        if value <= bound:
+            return str(bound)
+    return OVERFLOW_BUCKET
+
+
+def timing_key(route, *parts):
+    # Routes hold spaces and regex characters that memcached rejects in keys; the readable
+    # route is only kept in `TIMING_ROUTES_KEY`.
+    digest = hashlib.md5(route.encode('utf-8')).hexdigest()
+    return ':'.join((TIMING_KEY_PREFIX, digest, *parts))
+
+
+class TimingHistograms:
+    """
+    Per-route histograms of every metric. Counts are kept in process and added to the cache
+    every `flush_interval` seconds, so `dump_request_timings` sees all workers that share it.
+    Durations are summed in microseconds to keep the cache counters integers.
+    """
+
+    def __init__(self, flush_interval=10):
+        self.flush_interval = flush_interval
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def record(self, route, metrics):
+        with self.lock:
+            self.counts[route, 'count'] += 1
+            for metric in METRICS:
+                value = metrics[metric]
+                self.counts[route, metric, bucket_for(metric, value)] += 1
+                self.counts[route, metric, 'sum'] += value if metric == 'queries' else round(value * 1000)
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, defaultdict(int)
+            self.last_flush = time.monotonic()
+        if not counts:
+            return
+
+        routes = {key[0] for key in counts}
+        known = cache.get(TIMING_ROUTES_KEY, set())
+        if not routes <= known:
+            cache.set(TIMING_ROUTES_KEY, known | routes, timeout=None)
+        for (route, *parts), value in counts.items():
+            key = timing_key(route, *parts)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, timeout=None):
+                    cache.incr(key, value)
+
+
+histograms = TimingHistograms()
+
+
+def _route_keys(route):
+    """
+    `{cache key: (metric, bucket)}` of one route; the request count is `('count', None)`.
+    """
+    keys = {timing_key(route, 'count'): ('count', None)}
+    for metric in METRICS:
+        for bucket in (*map(str, metric_buckets(metric)), OVERFLOW_BUCKET, 'sum'):
+            keys[timing_key(route, metric, bucket)] = (metric, bucket)
+    return keys
+
+
+def get_timing_histograms():
+    """
+    `{route: {'count': n, metric: {'sum': total, 'buckets': {bound: n}}}}` from the cache.
+    Sums are in milliseconds, or queries.
+    """
+    report = {}
+    for route in sorted(cache.get(TIMING_ROUTES_KEY, set())):
+        keys = _route_keys(route)
+        stats = {'count': 0}
+        stats.update((metric, {'sum': 0, 'buckets': {}}) for metric in METRICS)
+        for key, value in cache.get_many(keys).items():
+            metric, bucket = keys[key]
+            if metric == 'count':
+                stats['count'] = value
+            elif bucket == 'sum':
+                stats[metric]['sum'] = value if metric == 'queries' else value / 1000
+            else:
+                stats[metric]['buckets'][bucket] = value
+        report[route] = stats
+    return report
+
+
+def reset_timing_histograms():
+    keys = [TIMING_ROUTES_KEY]
+    for route in cache.get(TIMING_ROUTES_KEY, set()):
+        keys.extend(_route_keys(route))
+    cache.delete_many(keys)
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} {match.route if match else "<unresolved>"}'
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection; it only measures inside a timed request.
+    The request's timing is a context variable, so queries run by `sync_to_async` worker
+    threads are counted too.
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # `connection_created` fires again on every reconnect of the same wrapper.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestTimingMiddleware:
+    """
+    Times a sample of requests (`STORE_TIMING_SAMPLE_RATE`, all by default): query count,
+    database, serializer and renderer time. They are sent back in a `Server-Timing` header,
+    logged as one JSON line to `store.timing` and added to the per-route histograms.
+    Works in both sync and async middleware chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Makes Django treat the instance as a coroutine function, as MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing = self.start_timing()
+        if timing is None:
+            return self.get_response(request)
+
+        token = _current_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish_timing(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = self.start_timing()
+        if timing is None:
+            return await self.get_response(request)
+
+        token = _current_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish_timing(request, response, timing)
+
+    def start_timing(self):
+        sample_rate = getattr(settings, 'STORE_TIMING_SAMPLE_RATE', 1.0)
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            return None
+        return RequestTiming()
+
+    def finish_timing(self, request, response, timing):
+        metrics = timing.metrics()
+        route = get_route(request)
+        if getattr(settings, 'STORE_TIMING_HEADER', True):
+            response['Server-Timing'] = server_timing(metrics)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'route': route, 'status': response.status_code, **metrics}))
+        histograms.record(route, metrics)
+        return response
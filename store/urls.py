@@ -1,6 +1,7 @@
 from django.urls import path
 from rest_framework.routers import SimpleRouter
 
+from store import async_views
 from store.views import BookViewSet, auth, UserBookRelationView
 
 router = SimpleRouter()
@@ -9,7 +10,11 @@ router.register(r'book', BookViewSet)
 router.register(r'book_relation', UserBookRelationView)
 
 urlpatterns = [
-    path('auth', auth)
+    path('auth', auth),
+    # The same endpoints as async views, for ASGI deployments.
+    path('async/book/', async_views.book_list, name='book-async-list'),
+    path('async/book/<int:pk>/', async_views.book_detail, name='book-async-detail'),
+    path('async/book_relation/<int:book>/', async_views.book_relation, name='userbookrelation-async-detail'),
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
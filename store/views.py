@@ -1,45 +1,341 @@
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.mixins import UpdateModelMixin
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, SAFE_METHODS
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
-from django.db.models import Count, Case, When
 
-from store.models import Book, UserBookRelation
+from store.cache import CachedResponseMixin, ConditionalGetMixin, invalidate_catalogue
+from store.counts import COUNT_HEADERS, CountMixin
+from store.filters import BookFilterSet
+from store.fast_serializers import BookListFastSerializer, FastListMixin
+from store.leaderboards import LEADERBOARDS, LEADERBOARD_SIZE, get_leaderboard
+from store.models import LIBRARY_KINDS, Book, UserBookRelation
+from store.pagination import KeysetPagination
+from store.parsers import JSONLinesParser
 from store.permissions import IsOwnerOrStaffOrReadOnly
-from store.serializers import BookSerializer, UserBookRelationSerializer
+from store.routers import ReplicaReadMixin
+from store.search import BookSearchFilter
+from store.serializers import BookSerializer, UserBookLibrarySerializer, UserBookRelationBatchSerializer, \
+    UserBookRelationSerializer, READERS_ALL, READERS_COUNT, READERS_TOP, parse_fields_param, parse_readers_param
+from store.write_buffer import ReadYourRelationWritesMixin, get_relation_buffer
 
 
-class BookViewSet(ModelViewSet):
+class BookViewSet(ReplicaReadMixin, ReadYourRelationWritesMixin, ConditionalGetMixin, CachedResponseMixin, CountMixin,
+                  FastListMixin, ModelViewSet):
     permission_classes = [IsOwnerOrStaffOrReadOnly]
-    queryset = Book.objects.all().annotate(
-            annotated_likes=Count(Case(When(userbookrelation__like=True, then=1))))\
-        .select_related('owner').prefetch_related('readers').order_by('id')
+    queryset = Book.objects.all().select_related('owner').order_by('id')
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filter_fields = ['price']
+    fast_list_serializer_class = BookListFastSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, OrderingFilter]
+    filterset_class = BookFilterSet                     # ?price_min=10&price_max=50&liked_by_me=true
     search_fields = ['name', 'author_name']             # ?search=Rolling
-    ordering_fields = ['price', 'author_name']          # ?ordering=price / ?ordering=-price
+    ordering_fields = ['price', 'author_name', 'rating']  # ?ordering=price / ?ordering=-price
+    ordering_aliases = {'relevance': '-search_rank'}    # ?search=Rolling&ordering=relevance
+    response_cache_headers = COUNT_HEADERS              # HEAD / ?count_only=1
+
+    # Model columns behind each serializer field; reads load nothing else.
+    field_columns = {
+        'id': ('id',),
+        'name': ('name',),
+        'price': ('price',),
+        'author_name': ('author_name',),
+        'annotated_likes': ('likes_count',),
+        'rating': ('rating',),
+        'rating_count': ('rating_count',),
+        'owner_name': ('owner__username',),
+    }
+
+    top_default_limit = 10
+    bulk_batch_size = 1000
+    export_fields = ('id', 'name', 'price', 'author_name', 'owner')
+
+    def get_readers_mode(self):
+        if self.request.method not in SAFE_METHODS:
+            return READERS_ALL, None
+        if not hasattr(self, '_readers_mode'):
+            self._readers_mode = parse_readers_param(self.request.query_params.get('readers'))
+        return self._readers_mode
+
+    def get_fields_selection(self):
+        """
+        `(fields, exclude, include)` from `?fields=id,name` / `?exclude=readers` /
+        `?include=my_relation`; writes get every field.
+        """
+        if self.request.method not in SAFE_METHODS:
+            return None, None, None
+        params = self.request.query_params
+        return tuple(parse_fields_param(params.get(name)) for name in ('fields', 'exclude', 'include'))
+
+    def get_rendered_fields(self):
+        if not hasattr(self, '_rendered_fields'):
+            self._rendered_fields = set(self.get_serializer().fields)
+        return self._rendered_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_rendered_fields()
+        if self.request.method in SAFE_METHODS:
+            queryset = self.prune_queryset(queryset, fields)
+
+        mode, _ = self.get_readers_mode()
+        if mode == READERS_ALL and 'readers' in fields:
+            # In relation order, the same order the fast list serializer reads them in.
+            readers = User.objects.only('id', 'first_name', 'last_name').order_by('userbookrelation__id')
+            queryset = queryset.prefetch_related(Prefetch('readers', queryset=readers))
+        elif mode == READERS_COUNT and 'readers_count' in fields:
+            relations = UserBookRelation.objects.filter(book=OuterRef('pk')).order_by()\
+                .values('book').annotate(count=Count('pk')).values('count')
+            queryset = queryset.annotate(readers_count=Coalesce(Subquery(relations), Value(0)))
+        # READERS_TOP needs the page's book ids, see `attach_top_readers`.
+
+        if 'my_relation' in fields:
+            relations = UserBookRelation.objects.filter(user=self.request.user)\
+                .only('book', 'like', 'in_bookmarks', 'rate')
+            queryset = queryset.prefetch_related(
+                Prefetch('userbookrelation_set', queryset=relations, to_attr='my_relations'))
+        return queryset
+
+    def attach_top_readers(self, books):
+        """
+        With `?readers=top:N`, load the first N readers of every book in `books` in one
+        query and set them as `top_reader_relations`. `values()` rows from the fast list
+        path are left alone; it reads its readers itself.
+        """
+        mode, limit = self.get_readers_mode()
+        books = [book for book in books if isinstance(book, Book)]
+        if mode != READERS_TOP or 'readers' not in self.get_rendered_fields() or not books:
+            return
+        relations = UserBookRelation.objects.first_per_book([book.pk for book in books], limit)\
+            .select_related('user').only('book', 'user__first_name', 'user__last_name').order_by('id')
+        by_book = defaultdict(list)
+        for relation in relations:
+            by_book[relation.book_id].append(relation)
+        for book in books:
+            book.top_reader_relations = by_book[book.pk]
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self.attach_top_readers(page)
+        return page
+
+    def get_object(self):
+        book = super().get_object()
+        self.attach_top_readers([book])
+        return book
+
+    def get_personal_fields(self):
+        """
+        Rendered fields that depend on who asks; responses with any are cached per user.
+        """
+        return self.get_rendered_fields() & {'my_relation'}
+
+    def prune_queryset(self, queryset, fields):
+        """
+        Load only the columns and the owner join that the rendered fields need, plus the
+        columns the page is ordered by.
+        """
+        columns = {'id'}
+        for name in fields:
+            columns.update(self.field_columns.get(name, ()))
+        ordering = OrderingFilter().get_ordering(self.request, queryset, self) or ()
+        columns.update(term.lstrip('-') for term in ordering)
+
+        queryset = queryset.select_related(None)
+        if 'owner_name' in fields:
+            queryset = queryset.select_related('owner')
+        return queryset.only(*sorted(columns))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['readers'] = self.get_readers_mode()
+        context['fields'] = self.get_fields_selection()
+        return context
 
     def perform_create(self, serializer):
         serializer.validated_data['owner'] = self.request.user
         serializer.save()
 
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """
+        Leaderboard: `?by=likes|rating|bookmarks&limit=N`, best first. Readers and
+        `?fields=` work as on the list.
+        """
+        by = request.query_params.get('by', 'likes')
+        if by not in LEADERBOARDS:
+            raise ValidationError({'by': [f'Expected one of: {", ".join(LEADERBOARDS)}.']})
+        try:
+            limit = int(request.query_params.get('limit', self.top_default_limit))
+        except ValueError:
+            limit = None
+        if limit is None or not 0 < limit <= LEADERBOARD_SIZE:
+            raise ValidationError({'limit': [f'Expected a number from 1 to {LEADERBOARD_SIZE}.']})
+
+        ids = get_leaderboard(by, limit)
+        rank = {pk: position for position, pk in enumerate(ids)}
+        queryset = self.get_queryset().filter(pk__in=ids)
+        serializer = self.get_fast_list_serializer()
+        if serializer is not None:
+            rows = sorted(serializer.values(queryset), key=lambda row: rank[row['id']])
+            data = serializer.to_representation(rows)
+        else:
+            books = sorted(queryset, key=lambda book: rank[book.pk])
+            self.attach_top_readers(books)
+            data = self.get_serializer(books, many=True).data
+        return Response({'by': by, 'results': data})
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONLinesParser], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Import books from a JSON Lines body, one `bulk_create` per batch. Invalid lines are
+        reported by line number and don't stop the rest of the import.
+        """
+        created = 0
+        errors = []
+        lines = iter(request.data)
+        while True:
+            batch = list(islice(lines, self.bulk_batch_size))
+            if not batch:
+                break
+
+            books = []
+            book_lines = []
+            for line_number, item, error in batch:
+                if error is None:
+                    serializer = self.get_serializer(data=item)
+                    if serializer.is_valid():
+                        books.append(Book(owner=request.user, **serializer.validated_data))
+                        book_lines.append(line_number)
+                        continue
+                    error = serializer.errors
+                errors.append({'line': line_number, 'errors': error})
+
+            try:
+                with transaction.atomic():
+                    Book.objects.bulk_create(books)
+            except DatabaseError as exc:
+                errors.extend({'line': line_number, 'errors': str(exc)} for line_number in book_lines)
+            else:
+                created += len(books)
+
+        if created:
+            invalidate_catalogue()
+        errors.sort(key=lambda error: error['line'])
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        return Response({'created': created, 'errors': errors}, status=response_status)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the (filtered) catalogue as JSON Lines straight from a server-side cursor.
+        """
+        queryset = self.filter_queryset(Book.objects.order_by('id'))
+        rows = queryset.values(*self.export_fields).iterator(chunk_size=self.bulk_batch_size)
+        lines = (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+
+        response = StreamingHttpResponse(lines, content_type=JSONLinesParser.media_type)
+        response['Content-Disposition'] = 'attachment; filename="books.jsonl"'
+        return response
+
 
 def auth(request):
     return render(request, 'oauth.html')
 
 
-class UserBookRelationView(UpdateModelMixin, GenericViewSet):
+class UserBookRelationView(ReplicaReadMixin, ReadYourRelationWritesMixin, UpdateModelMixin, GenericViewSet):
     permission_classes = [IsAuthenticated]
     queryset = UserBookRelation.objects.all()
     serializer_class = UserBookRelationSerializer
     lookup_field = 'book'
+    batch_max_length = 500
+    # A toggle is merged into the user's buffered state, not written after it.
+    buffered_actions = ('update', 'partial_update')
 
-    def get_object(self):
-        obj, _ = UserBookRelation.objects.get_or_create(user=self.request.user, book_id=self.kwargs['book'])
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        # The relation is addressed by the URL, never moved to another book.
+        serializer.validated_data.pop('book', None)
+
+        buffer = get_relation_buffer()
+        if buffer is not None and buffer.accepts(serializer.validated_data):
+            return self.buffered_update(buffer, serializer.validated_data)
+
+        self.flush_relation_writes()
+        try:
+            relation = UserBookRelation.objects.upsert(request.user, self.kwargs['book'], **serializer.validated_data)
+        except (Book.DoesNotExist, ValueError):
+            raise NotFound()
+        invalidate_catalogue()
+        return Response(self.get_serializer(relation).data)
+
+    def buffered_update(self, buffer, values):
+        """
+        Acknowledge a like / bookmark toggle once it is journaled; it is written with the
+        next flush. The response is the relation as it will be stored.
+        """
+        try:
+            book_id = int(self.kwargs['book'])
+        except ValueError:
+            raise NotFound()
+        relation = UserBookRelation.objects.filter(user=self.request.user, book_id=book_id).first()
+        if relation is None:
+            if not Book.objects.filter(pk=book_id).exists():
+                raise NotFound()
+            relation = UserBookRelation(user=self.request.user, book_id=book_id)
+        for field, value in buffer.put(self.request.user.pk, book_id, values).items():
+            setattr(relation, field, value)
+        return Response(self.get_serializer(relation).data)
+
+    @action(detail=False, methods=['get'], serializer_class=UserBookLibrarySerializer,
+            pagination_class=KeysetPagination)
+    def mine(self, request):
+        """
+        The user's library: `?kind=liked|bookmarked|rated`, in relation order, keyset-paginated.
+        """
+        kind = request.query_params.get('kind', 'liked')
+        if kind not in LIBRARY_KINDS:
+            raise ValidationError({'kind': [f'Expected one of: {", ".join(LIBRARY_KINDS)}.']})
+        page = self.paginate_queryset(UserBookRelation.objects.library(request.user, kind))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['post'], serializer_class=UserBookRelationBatchSerializer)
+    def batch(self, request):
+        """
+        Set like / bookmark / rate for many books at once: `[{"book": 1, "like": true}, ...]`.
+        Fields left out of an item are not changed; a book repeated later in the list wins.
+        """
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.batch_max_length)
+        serializer.is_valid(raise_exception=True)
+
+        changes = {}
+        for item in serializer.validated_data:
+            book_id = item.pop('book_id')
+            changes.setdefault(book_id, {}).update(item)
 
-        return obj
+        missing = set(changes) - set(Book.objects.filter(pk__in=changes).values_list('pk', flat=True))
+        if missing:
+            raise ValidationError({'book': [f'Invalid pk "{pk}" - object does not exist.' for pk in sorted(missing)]})
 
+        relations = UserBookRelation.objects.bulk_apply(request.user, changes)
+        invalidate_catalogue()
+        return Response(self.get_serializer(relations, many=True).data)
 
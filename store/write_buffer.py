@@ -0,0 +1,320 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from itertools import groupby
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+
+from store.cache import invalidate_catalogue
+from store.models import Book, UserBookRelation
+from store.routers import mark_primary_sticky
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+class RelationWriteBuffer:
+    """
+    Write-behind buffer for like / bookmark toggles.
+
+    `put()` merges a change into the pending state of its `(user, book)`, with the last write
+    winning per field, and appends it to a journal before it returns. A background thread
+    applies the pending state every `flush_interval` seconds with one `bulk_apply` per user;
+    a full buffer (`max_size` relations) is flushed by the writer instead.
+
+    The journal is a series of JSON Lines segments in `journal_dir`. A segment is deleted once
+    everything in it, and in every older segment, is committed. Flushing a single user appends
+    a marker line instead, which tells `recover()` (`manage.py replay_relation_journal`) to skip
+    that user's earlier lines. Every line holds absolute values, so replaying is idempotent.
+    With `fsync` off a segment survives a process crash but not a power loss.
+
+    The buffer lives in one process, and only that process can flush a user's writes before
+    the user reads; the prod profile refuses to enable it with more than one worker.
+    """
+    fields = ('like', 'in_bookmarks')
+
+    def __init__(self, journal_dir, flush_interval=1.0, max_size=10000, fsync=False):
+        self.journal_dir = str(journal_dir)
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        # Held for the whole of a flush, so a reader waiting for its writes sees them committed.
+        self.flush_lock = threading.Lock()
+        # {user_id: {book_id: values}}, and the number of relations in it.
+        self.pending = {}
+        self.size = 0
+        self.flushing_users = set()
+        # Journal lines are numbered; `segments` maps each live segment, oldest first, to
+        # `{user_id: number of the user's last line in it}` for the lines not yet committed.
+        self.seq = 0
+        self.segments = {}
+        self.user_segments = {}
+        self.instance = f'{time.time_ns()}-{os.getpid()}'
+        self.segment_count = 0
+        self.journal = None
+        self.flusher = None
+        self.stopped = threading.Event()
+        os.makedirs(self.journal_dir, exist_ok=True)
+
+    def accepts(self, values):
+        return bool(values) and set(values) <= set(self.fields)
+
+    def put(self, user_id, book_id, values):
+        """
+        Buffer `values` for the relation and return its whole pending state.
+        """
+        with self.lock:
+            self.seq += 1
+            self.write_journal({'seq': self.seq, 'user': user_id, 'book': book_id, 'values': values})
+            self.segments[self.journal.name][user_id] = self.seq
+            self.user_segments.setdefault(user_id, set()).add(self.journal.name)
+            books = self.pending.setdefault(user_id, {})
+            if book_id not in books:
+                self.size += 1
+            state = books.setdefault(book_id, {})
+            state.update(values)
+            state = dict(state)
+            full = self.size >= self.max_size
+        self.start()
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered relation writes failed')
+        return state
+
+    def get(self, user_id, book_id):
+        with self.lock:
+            return dict(self.pending.get(user_id, {}).get(book_id, {}))
+
+    def has_pending(self, user_id):
+        with self.lock:
+            return user_id in self.pending
+
+    def open_segment(self):
+        self.segment_count += 1
+        name = os.path.join(self.journal_dir, f'relations-{self.instance}-{self.segment_count:09d}.jsonl')
+        self.journal = open(name, 'a', encoding='utf-8')
+        self.segments[name] = {}
+
+    def write_journal(self, entry):
+        if self.journal is None:
+            self.open_segment()
+        self.journal.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.journal.flush()
+        if self.fsync:
+            os.fsync(self.journal.fileno())
+
+    def flush(self, user_id=None):
+        """
+        Apply everything buffered so far, or only the writes of `user_id`. Returns the number
+        of relations written.
+        """
+        with self.flush_lock:
+            with self.lock:
+                if user_id is None:
+                    pending, self.pending, self.size = self.pending, {}, 0
+                    # Start a new segment, so the current one can go once it is committed.
+                    if self.journal is not None:
+                        self.journal.close()
+                        self.journal = None
+                else:
+                    books = self.pending.pop(user_id, None)
+                    pending = {user_id: books} if books else {}
+                    self.size -= len(books or ())
+                seq = self.seq
+                self.flushing_users = set(pending)
+
+            try:
+                if pending:
+                    apply_relation_changes({(user_id, book_id): values for user_id, books in pending.items()
+                                            for book_id, values in books.items()})
+            except Exception:
+                # Put the changes back under anything written since; the journal still has them.
+                with self.lock:
+                    for pending_user, books in pending.items():
+                        current = self.pending.setdefault(pending_user, {})
+                        for book_id, values in books.items():
+                            self.size += book_id not in current
+                            current[book_id] = {**values, **current.get(book_id, {})}
+                raise
+            finally:
+                self.flushing_users = set()
+
+            with self.lock:
+                self.commit(pending, seq, mark=user_id is not None)
+            return sum(len(books) for books in pending.values())
+
+    def commit(self, user_ids, seq, mark):
+        """
+        Forget the journal lines of `user_ids` up to line `seq`, which are committed, and
+        delete the segments that no longer hold anything else.
+        """
+        for user_id in user_ids:
+            names = self.user_segments.get(user_id, set())
+            for name in [name for name in names if self.segments[name][user_id] <= seq]:
+                del self.segments[name][user_id]
+                names.discard(name)
+            if not names:
+                self.user_segments.pop(user_id, None)
+
+        # Oldest first: a newer segment may hold the markers for lines in an older one.
+        current = getattr(self.journal, 'name', None)
+        while self.segments:
+            name, users = next(iter(self.segments.items()))
+            if users or name == current:
+                break
+            del self.segments[name]
+            self.remove([name])
+
+        if mark and self.segments:
+            for user_id in user_ids:
+                self.write_journal({'committed': user_id, 'seq': seq})
+
+    def flush_user(self, user_id):
+        """
+        Flush the buffered writes of `user_id`, so its next read sees them.
+        """
+        if self.has_pending(user_id):
+            self.flush(user_id)
+        elif user_id in self.flushing_users:
+            # A running flush took them; wait for it to commit.
+            with self.flush_lock:
+                pass
+
+    def remove(self, segments):
+        for name in segments:
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def recover(self):
+        """
+        Apply the journal segments another run of the buffer left behind and delete them.
+        Returns the number of relations written.
+        """
+        with self.lock:
+            own = set(self.segments)
+        segments = sorted(name for name in glob.glob(os.path.join(self.journal_dir, 'relations-*.jsonl'))
+                          if name not in own)
+        changes = {}
+        # Line numbers and markers only mean something within the run that wrote them.
+        for _, names in groupby(segments, key=lambda name: name.rsplit('-', 1)[0]):
+            entries, committed = [], {}
+            for name in names:
+                with open(name, encoding='utf-8') as journal:
+                    for line in journal:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # The write the crash interrupted; it was never acknowledged.
+                            continue
+                        if 'committed' in entry:
+                            committed[entry['committed']] = max(entry['seq'], committed.get(entry['committed'], 0))
+                        else:
+                            entries.append(entry)
+            for entry in entries:
+                if entry['seq'] > committed.get(entry['user'], 0):
+                    changes.setdefault((entry['user'], entry['book']), {}).update(entry['values'])
+        if changes:
+            apply_relation_changes(changes)
+        self.remove(segments)
+        return len(changes)
+
+    def start(self):
+        if self.flusher is None and self.flush_interval:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = threading.Thread(target=self.run, name='store-relation-buffer', daemon=True)
+                    self.flusher.start()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered relation writes failed')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.flush()
+
+
+def apply_relation_changes(changes):
+    """
+    Write `{(user_id, book_id): values}` with one `bulk_apply` per user, in one transaction.
+    Relations of books or users deleted in the meantime are dropped.
+    """
+    book_ids = set(Book.objects.filter(pk__in={book_id for _, book_id in changes}).values_list('pk', flat=True))
+    users = User.objects.in_bulk({user_id for user_id, _ in changes})
+    by_user = {}
+    for (user_id, book_id), values in changes.items():
+        if user_id in users and book_id in book_ids:
+            by_user.setdefault(user_id, {})[book_id] = values
+    with transaction.atomic():
+        for user_id, user_changes in by_user.items():
+            UserBookRelation.objects.bulk_apply(users[user_id], user_changes)
+        invalidate_catalogue()
+    for user_id in by_user:
+        mark_primary_sticky(user_id)
+
+
+def get_relation_buffer():
+    """
+    The buffer configured by `STORE_RELATION_BUFFER`, or `None` when writes are synchronous.
+    """
+    global _buffer
+    config = getattr(settings, 'STORE_RELATION_BUFFER', None)
+    if not config:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = RelationWriteBuffer(
+                journal_dir=config['JOURNAL_DIR'],
+                flush_interval=config.get('FLUSH_INTERVAL', 1.0),
+                max_size=config.get('MAX_SIZE', 10000),
+                fsync=config.get('FSYNC', False),
+            )
+        return _buffer
+
+
+@receiver(setting_changed)
+def reset_relation_buffer(setting, **kwargs):
+    global _buffer
+    if setting == 'STORE_RELATION_BUFFER' and _buffer is not None:
+        _buffer.stopped.set()
+        _buffer = None
+
+
+class ReadYourRelationWritesMixin:
+    """
+    Flushes the requesting user's buffered relation writes before the view runs, so
+    everything it reads or writes comes after them. Actions in `buffered_actions` may buffer
+    writes of their own and call `flush_relation_writes()` only when they don't.
+    """
+    buffered_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action not in self.buffered_actions:
+            self.flush_relation_writes()
+
+    def flush_relation_writes(self):
+        buffer = get_relation_buffer()
+        if buffer is not None and self.request.user.is_authenticated:
+            buffer.flush_user(self.request.user.pk)